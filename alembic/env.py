@@ -10,7 +10,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # ✅ Import your Base and all models to register them with metadata
 from backend.db_config import Base
-from backend.models import dashboard_model, user_model, settings_model  # ← Make sure these files exist and contain your models
+from backend.models import dashboard_model, user_model, settings_model, video_job_model  # ← Make sure these files exist and contain your models
 
 # ✅ Metadata used by Alembic for autogeneration
 target_metadata = Base.metadata
@@ -0,0 +1,44 @@
+"""Add video_jobs table
+
+Revision ID: 4c2b7e9d1f63
+Revises: 71f3e381a97f
+Create Date: 2026-10-18 09:12:40.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c2b7e9d1f63'
+down_revision: Union[str, None] = '71f3e381a97f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('video_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('video_path', sa.String(), nullable=False),
+    sa.Column('mode', sa.String(length=20), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.Float(), nullable=False),
+    sa.Column('results', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('owner', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_video_jobs_id'), 'video_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_video_jobs_status'), 'video_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_video_jobs_status'), table_name='video_jobs')
+    op.drop_index(op.f('ix_video_jobs_id'), table_name='video_jobs')
+    op.drop_table('video_jobs')
@@ -0,0 +1,21 @@
+import pytest
+
+
+class MemoryJobStore:
+    """JobManager store in a dict, instead of the video_jobs table."""
+
+    def __init__(self):
+        self.rows = {}
+    def create(self, **fields):
+        self.rows[fields["id"]] = {"results": None, "error": None, **fields}
+    def update(self, job_id, **fields):
+        self.rows[job_id].update(fields)
+    def get(self, job_id):
+        return dict(self.rows[job_id]) if job_id in self.rows else None
+    def unfinished(self):
+        return [dict(r) for r in self.rows.values() if r["status"] not in ("done", "failed", "cancelled")]
+
+
+@pytest.fixture
+def job_store():
+    return MemoryJobStore()
@@ -1,3 +1,4 @@
+import os
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
@@ -27,6 +28,10 @@ from backend.routes import (
 from backend.ws_broadcast import websocket_endpoint
 from backend.routes.ws_live import router as ws_live_router
 from backend.routes.recent_logins import router as recent_logins_router
+from backend.routes.health import router as health_router, start_warm_up
+from backend.tasks.jobs import jobs
+from backend.tasks.sharded_video import shutdown_shard_pool
+from backend.models import video_job_model  # noqa: F401  creates the video_jobs table
 
 
 # Create database tables
@@ -52,6 +57,24 @@ app.include_router(maintainance.router)
 app.include_router(settings_router.router)
 app.include_router(ws_live_router)
 app.include_router(recent_logins_router)
+app.include_router(health_router)
+
+# Vision models load lazily; set MODEL_WARMUP=1 to load them in the
+# background as soon as the worker starts instead of on the first upload.
+@app.on_event("startup")
+async def warm_up_models():
+    if os.getenv("MODEL_WARMUP", "0") == "1":
+        start_warm_up()
+
+# Video jobs left queued/running by a worker that has since exited are failed.
+@app.on_event("startup")
+async def recover_jobs():
+    jobs.recover()
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    jobs.shutdown()
+    shutdown_shard_pool()
 
 
 # WebSocket endpoint
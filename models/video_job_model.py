@@ -0,0 +1,20 @@
+# models/video_job_model.py
+
+from sqlalchemy import Column, String, Float, DateTime, JSON, Text, func
+from backend.db_config import Base
+
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+
+    id          = Column(String(32), primary_key=True, index=True)   # uuid4 hex
+    filename    = Column(String,  nullable=False)
+    video_path  = Column(String,  nullable=False)
+    mode        = Column(String(20), nullable=False)                 # "matching" | "ml"
+    status      = Column(String(20), nullable=False, index=True)     # queued | running | done | failed | cancelled
+    progress    = Column(Float,   nullable=False, default=0.0)       # 0.0 … 1.0
+    results     = Column(JSON,    nullable=True)                     # list of alert events
+    error       = Column(Text,    nullable=True)
+    owner       = Column(String,  nullable=True)                     # "host:pid" of the worker running it
+    created_at  = Column(DateTime(timezone=False), nullable=False, server_default=func.now())
+    started_at  = Column(DateTime(timezone=False), nullable=True)
+    finished_at = Column(DateTime(timezone=False), nullable=True)
@@ -0,0 +1,122 @@
+# backend/routes/health.py
+
+import threading
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+import backend.tasks.match_faces  # noqa: F401  registers the vision models
+from backend.tasks.model_registry import registry, overall_state
+from backend.tasks.inference_server import inference_client, SERVER_MODELS
+from backend.tasks.inference_executor import inference
+from backend.tasks.process_frame import live_batcher
+from backend.tasks.face_quality import gate
+from backend.tasks.motion import motion_stats
+from backend.utils.auth import get_current_user
+from backend.models.user_model import User
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"],
+)
+
+# what detection and identification requests need; the rest (clusters, TTA
+# augmentations for ML video jobs) loads on first use without gating traffic
+SERVING_MODELS = ("yolo", "facenet", "classifier", "matcher")
+
+
+def local_models():
+    """Registry artifacts this worker loads itself; with an inference server, the rest live there."""
+    if inference_client() is None:
+        return registry.names()
+    return [n for n in registry.names() if n not in SERVER_MODELS]
+
+def model_status():
+    """
+    Registry status of the models serving this worker: its own artifacts,
+    plus the inference server's when one is configured.
+    """
+    status = _model_status()
+    serving = [a for name, a in status["artifacts"].items() if name in SERVING_MODELS]
+    status["ready"] = status.get("error") is None and overall_state(a["state"] for a in serving) == "ready"
+    return status
+
+def _model_status():
+    status = registry.status(local_models())
+    client = inference_client()
+    if client is None:
+        return status
+    try:
+        server = client.call("status")
+    except Exception as e:
+        return {**status, "state": "failed", "ready": False, "error": f"inference server unreachable: {e}"}
+    artifacts = {**server["artifacts"], **status["artifacts"]}
+    return {
+        "state": overall_state(a["state"] for a in artifacts.values()),
+        "rss_mb": status["rss_mb"],
+        "inference_server": client.address,
+        "artifacts": artifacts,
+    }
+
+_warm_lock = threading.Lock()
+_warming   = set()
+
+def start_warm_up(names=None):
+    """
+    Load this worker's models (or those of `names` it owns) in a background
+    thread, once; the inference server, if any, warms its own up at start.
+    """
+    with _warm_lock:
+        states = registry.status(local_models())["artifacts"]
+        # a model is warmed once, unless its load failed
+        names = [n for n, a in states.items()
+                 if (names is None or n in names) and (n not in _warming or a["state"] == "failed")]
+        _warming.update(names)
+    if names:
+        threading.Thread(target=registry.warm_up, args=(names,), name="model-warmup", daemon=True).start()
+
+
+@router.get("")
+def liveness():
+    """
+    The API process is up. Does not wait for models, so non-vision
+    endpoints are healthy as soon as the app has started.
+    """
+    return {"status": "ok", "models": model_status()["state"]}
+
+@router.get("/ready")
+def readiness():
+    """
+    200 once the models serving vision requests (SERVING_MODELS) are
+    loaded, 503 while they are cold/warming or failed. Use this to gate
+    vision traffic. The first probe starts loading them if nothing has.
+    """
+    start_warm_up(SERVING_MODELS)
+    status = model_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@router.get("/models")
+def models():
+    """Per-model state, load time and RSS growth."""
+    return model_status()
+
+@router.get("/inference")
+def inference_metrics():
+    """
+    Live inference load in this worker: live frames waiting for a batch
+    and how long they waited, how well they are being batched, run times
+    of the inference threads, how many face crops the quality gate kept
+    from the embedder, by reason, and how many live frames the motion
+    gates spared from detection.
+    """
+    return {
+        "executor": inference.stats(),
+        "live_batching": live_batcher().stats(),
+        "face_quality": gate.stats(),
+        "motion": motion_stats(),
+    }
+
+@router.post("/warmup")
+def warm_up(current_user: User = Depends(get_current_user)):
+    """Start loading all models in the background and return immediately."""
+    start_warm_up()
+    return model_status()
@@ -1,30 +1,65 @@
 # backend/routes/upload_route.py
 
 import os
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import JSONResponse
-from backend.tasks.match_faces import detect_and_match
-from backend.tasks.process_frame import process_frame
-
-import cv2
-import numpy as np
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from backend.tasks.jobs import jobs, OWNER, FINISHED
+from backend.schemas.job_schema import JobResponse
 
 router = APIRouter()
 
-@router.post("/upload")
+UPLOAD_DIR = os.path.abspath("video_uploads")
+
+@router.post("/upload", status_code=202)
 async def upload_video(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     mode: str = Form("matching")
 ):
-    UPLOAD_DIR = os.path.abspath("video_uploads")
+    """
+    Store the video and queue it for processing. Poll
+    GET /upload/jobs/{job_id} for progress and results.
+    """
     os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-    out_path = os.path.join(UPLOAD_DIR, file.filename)
+    job_id   = jobs.new_id()
+    filename = os.path.basename(file.filename or "upload")
+    # prefixed with the job id so uploads with the same name never overwrite each other
+    out_path = os.path.join(UPLOAD_DIR, f"{job_id}_{filename}")
     with open(out_path, "wb") as f:
-        f.write(await file.read())
+        while chunk := await file.read(1 << 20):
+            f.write(chunk)
+
+    jobs.submit(out_path, filename, mode, job_id=job_id)
+    job = jobs.get(job_id)
+    return {
+        "status": job["status"],
+        "job_id": job_id,
+        "queue_position": job.get("queue_position"),
+    }
+
 
-    background_tasks.add_task(detect_and_match, out_path, mode)
-    return {"status": "processing"}
+@router.get("/upload/jobs/{job_id}", response_model=JobResponse)
+def job_status(job_id: str):
+    """Status, queue position, progress and, once done, the alert events of a job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
 
 
+@router.post("/upload/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job. Running jobs stop at the next sampled
+    frame, so the status may read "running" for a moment longer.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not jobs.cancel(job_id):
+        job = jobs.get(job_id)
+        if job["status"] in FINISHED:
+            raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+        if job.get("owner") == OWNER:
+            raise HTTPException(status_code=409, detail="Job is finishing and can no longer be cancelled")
+        raise HTTPException(status_code=409, detail="Job is handled by another worker")
+    return JobResponse(**jobs.get(job_id))
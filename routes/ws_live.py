@@ -1,11 +1,15 @@
 # backend/routes/ws_live.py
 
 import json
+import time
+import asyncio
 import cv2
 import numpy as np
 import httpx
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from backend.tasks.process_frame import process_frame
+from backend.tasks.process_frame import process_frame, new_identity_cache
+from backend.tasks.motion import MotionGate
+from backend.tasks.inference_executor import inference
 
 router = APIRouter()
 
@@ -27,49 +31,144 @@ async def send_dashboard_update(total=1, recognized=0, unrecognized=0, login_att
         except Exception:
             pass  # swallow any errors
 
+class LatestFrame:
+    """
+    One-slot mailbox between the socket reader and the frame processor.
+
+    `put` overwrites a frame nobody has picked up yet, counting it as
+    dropped, so the processor always gets the newest frame and never works
+    through a backlog: under overload frames are skipped, not delayed.
+    """
+
+    def __init__(self):
+        self._frame   = None
+        self._ready   = asyncio.Event()
+        self.received = 0
+        self.dropped  = 0
+
+    def put(self, frame_bytes):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (frame_bytes, time.monotonic())
+        self._ready.set()
+
+    async def get(self):
+        """Wait for the newest unprocessed frame: (jpeg bytes, arrival time)."""
+        await self._ready.wait()
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+def _decode(frame_bytes, motion, arrived):
+    """
+    Blocking part of a live frame's intake: (readable, full BGR frame or
+    None when the motion gate skips it).
+    """
+    buf = np.frombuffer(frame_bytes, np.uint8)
+    # the JPEG decoder can produce a 1/4-size grey image at a fraction of
+    # the cost; that is all the motion check needs
+    preview = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if preview is None:
+        return False, None
+    if not motion.should_detect(preview, arrived):
+        return True, None
+    return True, cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+async def _process_latest(websocket, mailbox, state):
+    processed = 0
+    # this camera's recently identified faces, so people standing in view
+    # are neither re-embedded nor re-alerted every frame
+    cache = new_identity_cache()
+    # skips detection while the scene does not change
+    motion = MotionGate()
+    while True:
+        frame_bytes, arrived = await mailbox.get()
+        # decoding and the motion check run off the loop, like inference
+        readable, img = await inference.run(_decode, frame_bytes, motion, arrived)
+        if not readable:
+            continue
+
+        # run per-frame detection, unless nothing moved since the last one
+        if img is not None:
+            try:
+                evt = await process_frame(img, state["mode"], cache)
+            except Exception as e:
+                # e.g. the inference server restarting: report it and carry on
+                # with the next frame instead of dropping the camera
+                print(f"[ws_live] frame failed: {type(e).__name__}: {e}")
+                evt = {"type": "error", "message": f"processing failed: {e}", "location": None, "faces": []}
+        else:
+            # the faces in view have not moved; keep their tracks (and so
+            # their identities and alert dedup) alive until the next detection
+            cache.touch(time.monotonic())
+            evt = {"type": "warning", "message": "no motion", "location": None, "faces": []}
+        processed += 1
+
+        # 1) send it back to client, with how far behind the camera we are
+        await websocket.send_json({
+            **evt,
+            "frames": {
+                "received": mailbox.received,
+                "processed": processed,
+                "dropped": mailbox.dropped,
+                "motion_skipped": motion.counts["skipped"],
+                "latency_ms": round((time.monotonic() - arrived) * 1000),
+            },
+        })
+
+        # 2) update dashboard stats, one count per alerted face (not per
+        #    frame a student keeps standing there)
+        faces = [f for f in evt.get("faces", []) if f.get("alert")]
+        if faces:
+            recognized = sum(1 for f in faces if f.get("type") == "success")
+            # no login attempts here
+            await send_dashboard_update(len(faces), recognized, len(faces) - recognized)
+
 @router.websocket("/ws/live")
 async def live_feed_ws(websocket: WebSocket):
-    mode = websocket.query_params.get("mode", "matching")
+    """
+    Frames are read as fast as the client sends them and handed to a
+    separate processing task through a LatestFrame slot. Each reply
+    carries received/processed/dropped counts and the latency of the
+    frame it answers.
+    """
+    state = {"mode": websocket.query_params.get("mode", "matching")}
     await websocket.accept()
 
+    mailbox   = LatestFrame()
+    processor = asyncio.create_task(_process_latest(websocket, mailbox, state))
     try:
         while True:
             msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if processor.done():
+                break  # processing failed or the socket closed under it
 
             # handle text control frames (mode change)
             if "text" in msg and msg["text"]:
                 try:
                     data = json.loads(msg["text"])
                     if data.get("type") == "mode" and data.get("mode") in ("matching", "ml"):
-                        mode = data["mode"]
+                        state["mode"] = data["mode"]
                 except json.JSONDecodeError:
                     pass
                 continue
 
             # binary frame = JPEG
             frame_bytes = msg.get("bytes")
-            if not frame_bytes:
-                continue
-
-            img = cv2.imdecode(
-                np.frombuffer(frame_bytes, np.uint8),
-                cv2.IMREAD_COLOR
-            )
-
-            # run per-frame detection
-            evt = await process_frame(img, mode)
-
-            # 1) send it back to client
-            await websocket.send_json(evt)
-
-            # 2) update dashboard stats
-            #   every frame = 1 total face
-            #   recognized_faces = 1 if evt.type=="success"
-            total = 1
-            recognized = 1 if evt.get("type") == "success" else 0
-            unrecognized = 1 if evt.get("type") == "warning" else 0
-            # no login attempts here
-            await send_dashboard_update(total, recognized, unrecognized)
+            if frame_bytes:
+                mailbox.put(frame_bytes)
 
     except WebSocketDisconnect:
-        return
+        pass
+    finally:
+        processor.cancel()
+        try:
+            await processor
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[ws_live] frame processing stopped: {type(e).__name__}: {e}")
+        print(f"[ws_live] closed: {mailbox.received} frames received, {mailbox.dropped} dropped")
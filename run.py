@@ -1,4 +1,5 @@
 import os
+import secrets
 import multiprocessing
 import uvicorn
 from config import settings
@@ -6,6 +7,10 @@ from config import settings
 # Get the number of CPU cores
 workers = multiprocessing.cpu_count()
 
+# Model-owning inference processes shared by all workers (0 = each worker
+# loads its own models, as before)
+inference_servers = int(os.getenv("INFERENCE_SERVERS", "0"))
+
 # Configuration for production server
 config = {
     "host": os.getenv("API_HOST", "0.0.0.0"),
@@ -14,9 +19,24 @@ config = {
     "reload": False  # Disable auto-reload in production
 }
 
+def start_inference_servers(n):
+    from backend.tasks.inference_server import serve, socket_paths
+    # a fresh key per run unless one is configured; only processes started
+    # from here (servers and uvicorn workers) inherit it
+    key = os.environ.setdefault("INFERENCE_AUTHKEY", secrets.token_hex(32))
+    paths = socket_paths(n)
+    ctx = multiprocessing.get_context("spawn")
+    for path in paths:
+        ctx.Process(target=serve, args=(path, key.encode()), name="inference-server", daemon=True).start()
+    # uvicorn workers inherit this and become thin clients
+    os.environ["INFERENCE_SOCKETS"] = ",".join(paths)
+    return paths
+
 if __name__ == "__main__":
     print(f"Starting {settings.PROJECT_NAME} v{settings.PROJECT_VERSION}")
     print(f"Workers: {workers}")
+    if inference_servers:
+        print(f"Inference servers: {start_inference_servers(inference_servers)}")
     uvicorn.run(
         "main:app",
         **config
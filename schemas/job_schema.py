@@ -0,0 +1,28 @@
+# backend/schemas/job_schema.py
+
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class JobResponse(BaseModel):
+    """
+    Status of one uploaded-video job.
+
+    Fields:
+      - status: "queued", "running", "done", "failed" or "cancelled".
+      - queue_position: 1-based place in line while queued, else None.
+      - progress: fraction of the video processed, 0.0 to 1.0.
+      - results: the alert events the job produced, once done.
+    """
+    id: str
+    filename: str
+    mode: str
+    status: str
+    queue_position: Optional[int] = None
+    progress: float
+    results: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,268 @@
+# backend/tasks/ann_index.py
+
+import os
+import time
+import hashlib
+import numpy as np
+
+from backend.tasks.gallery import l2_normalize
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# "ivf" (pure NumPy), "faiss" or "hnswlib"; the last two are optional installs
+ANN_BACKEND     = os.getenv("ANN_BACKEND", "ivf")
+# galleries with fewer rows than this are scanned exactly, the ANN isn't worth it
+ANN_MIN_ROWS    = int(os.getenv("ANN_MIN_ROWS", "20000"))
+ANN_TOP_K       = int(os.getenv("ANN_TOP_K", "64"))
+IVF_NPROBE      = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_M          = int(os.getenv("HNSW_M", "16"))
+HNSW_EF         = int(os.getenv("HNSW_EF", "64"))
+
+
+def index_path_for(embedding_json, backend=ANN_BACKEND):
+    """Indexes are saved next to the embeddings JSON they were built from."""
+    return f"{os.path.splitext(embedding_json)[0]}.{backend}.idx"
+
+def gallery_fingerprint(gallery):
+    h = hashlib.sha1(gallery.matrix.tobytes())
+    h.update(gallery.offsets.tobytes())
+    return h.hexdigest()
+
+
+# ─── BACKENDS ─────────────────────────────────────────────────────────────
+class IVFFlatIndex:
+    """
+    Inverted-file index over L2-normalized rows, in plain NumPy.
+
+    Rows are bucketed by a spherical k-means coarse quantizer; a query only
+    scans the `nprobe` buckets whose centroids are closest to it.
+    """
+    backend = "ivf"
+
+    def __init__(self, nlist=None, nprobe=IVF_NPROBE):
+        self.nlist  = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.list_offsets = None
+        self.list_rows = None
+        self.vectors = None
+
+    def build(self, vectors, n_iter=10, seed=0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # re-seed empty buckets from random rows so every list stays usable
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        self.nlist = nlist
+        self.centroids = centroids
+        self.list_rows = order.astype(np.int64)
+        self.list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=nlist))))
+        self.vectors = vectors[order]
+        return self
+
+    def search(self, query, k):
+        """Return the row ids of (approximately) the k most similar rows."""
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        spans = [np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probes]
+        cand = np.concatenate(spans)
+        if not len(cand):
+            return np.zeros(0, dtype=np.int64)
+        sims = self.vectors[cand] @ query
+        k = min(k, len(cand))
+        top = np.argpartition(-sims, k - 1)[:k]
+        return self.list_rows[cand[top]]
+
+    def save(self, path, fingerprint):
+        with open(path, "wb") as f:
+            np.savez(
+                f, centroids=self.centroids, list_rows=self.list_rows,
+                list_offsets=self.list_offsets, vectors=self.vectors,
+                fingerprint=fingerprint,
+            )
+
+    @classmethod
+    def load(cls, path, nprobe=IVF_NPROBE, **_):
+        # nprobe is a query-time setting, so it comes from the caller, not the file
+        data = np.load(path)
+        idx = cls(nlist=len(data["centroids"]), nprobe=nprobe)
+        idx.centroids = data["centroids"]
+        idx.list_rows = data["list_rows"]
+        idx.list_offsets = data["list_offsets"]
+        idx.vectors = data["vectors"]
+        return idx, str(data["fingerprint"])
+
+
+class FaissIndex:
+    """IVF-flat on inner product via faiss (`pip install faiss-cpu`)."""
+    backend = "faiss"
+
+    def __init__(self, nlist=None, nprobe=IVF_NPROBE):
+        import faiss
+        self._faiss = faiss
+        self.nlist  = nlist
+        self.nprobe = nprobe
+        self.index  = None
+
+    def build(self, vectors):
+        faiss = self._faiss
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        nlist = min(self.nlist or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+        quantizer = faiss.IndexFlatIP(vectors.shape[1])
+        self.index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+        self.index.train(vectors)
+        self.index.add(vectors)
+        self.index.nprobe = self.nprobe
+        return self
+
+    def search(self, query, k):
+        _, ids = self.index.search(np.asarray(query, dtype=np.float32)[None, :], k)
+        return ids[0][ids[0] >= 0].astype(np.int64)
+
+    def save(self, path, fingerprint):
+        self._faiss.write_index(self.index, path)
+        with open(path + ".sha1", "w") as f:
+            f.write(fingerprint)
+
+    @classmethod
+    def load(cls, path, nprobe=IVF_NPROBE, **_):
+        idx = cls(nprobe=nprobe)
+        idx.index = idx._faiss.read_index(path)
+        idx.index.nprobe = idx.nprobe
+        with open(path + ".sha1") as f:
+            return idx, f.read().strip()
+
+
+class HnswlibIndex:
+    """HNSW graph over normalized rows via hnswlib (`pip install hnswlib`)."""
+    backend = "hnswlib"
+
+    def __init__(self, m=HNSW_M, ef=HNSW_EF, ef_construction=200):
+        import hnswlib
+        self._hnswlib = hnswlib
+        self.m = m
+        self.ef = ef
+        self.ef_construction = ef_construction
+        self.index = None
+
+    def build(self, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.index = self._hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), M=self.m, ef_construction=self.ef_construction)
+        self.index.add_items(vectors, np.arange(len(vectors)))
+        self.index.set_ef(self.ef)
+        return self
+
+    def search(self, query, k):
+        k = min(k, self.index.get_current_count())
+        ids, _ = self.index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        return ids[0].astype(np.int64)
+
+    def save(self, path, fingerprint):
+        self.index.save_index(path)
+        with open(path + ".sha1", "w") as f:
+            f.write(f"{self.index.dim} {fingerprint}")
+
+    @classmethod
+    def load(cls, path, ef=HNSW_EF, **_):
+        idx = cls(ef=ef)
+        with open(path + ".sha1") as f:
+            dim, fingerprint = f.read().split()
+        idx.index = idx._hnswlib.Index(space="ip", dim=int(dim))
+        idx.index.load_index(path)
+        idx.index.set_ef(idx.ef)
+        return idx, fingerprint
+
+
+BACKENDS = {
+    "ivf": IVFFlatIndex,
+    "faiss": FaissIndex,
+    "hnswlib": HnswlibIndex,
+}
+
+
+# ─── MATCHER ──────────────────────────────────────────────────────────────
+class AnnMatcher:
+    """
+    Drop-in for `Gallery.best_match` and `best_matches` backed by an ANN index.
+
+    The index returns the top-k nearest gallery rows; the students owning
+    them are then re-ranked exactly by their full mean cosine score.
+    """
+
+    def __init__(self, gallery, index, k=ANN_TOP_K):
+        self.gallery = gallery
+        self.index   = index
+        self.k       = k
+
+    def candidates(self, probe):
+        rows = self.index.search(l2_normalize(probe), self.k)
+        return np.unique(self.gallery.row_owner[rows])
+
+    def best_match(self, probe, threshold):
+        students = self.candidates(probe)
+        if not len(students):
+            return None, -1.0
+        scores = self.gallery.score_students(probe, students)
+        j = int(np.argmax(scores))
+        score = float(scores[j])
+        if score < threshold:
+            return None, -1.0
+        return self.gallery.student_ids[students[j]], score
+
+    def best_matches(self, probes, threshold):
+        return [self.best_match(probe, threshold) for probe in probes]
+
+
+def build_index(gallery, backend=ANN_BACKEND, **params):
+    return BACKENDS[backend](**params).build(gallery.matrix)
+
+def load_or_build_index(gallery, path, backend=ANN_BACKEND, **params):
+    """
+    Load the index saved at `path`, rebuilding it if missing or stale.
+    Query-time `params` (nprobe, ef) apply to a loaded index as well; only
+    the built structure is taken from the file.
+    """
+    fingerprint = gallery_fingerprint(gallery)
+    if os.path.exists(path):
+        try:
+            index, saved = BACKENDS[backend].load(path, **params)
+            if saved == fingerprint:
+                return index
+            print(f"[ann] {path} is stale, rebuilding…")
+        except Exception as e:
+            print(f"[ann] Failed to load {path}: {e}")
+    t0 = time.perf_counter()
+    index = build_index(gallery, backend, **params)
+    print(f"[ann] Built {backend} index over {len(gallery.matrix)} rows in {time.perf_counter() - t0:.2f}s")
+    try:
+        index.save(path, fingerprint)
+    except OSError as e:
+        print(f"[ann] Could not save index to {path}: {e}")
+    return index
+
+def build_matcher(gallery, embedding_json, backend=ANN_BACKEND):
+    """
+    Return an object with `best_match(probe, threshold)` and
+    `best_matches(probes, threshold)` for `gallery`:
+    the gallery itself for small galleries, an AnnMatcher otherwise.
+    """
+    if len(gallery.matrix) < ANN_MIN_ROWS:
+        return gallery
+    try:
+        index = load_or_build_index(gallery, index_path_for(embedding_json, backend), backend)
+    except ImportError as e:
+        print(f"[ann] {backend} backend unavailable ({e}), using brute-force matching")
+        return gallery
+    return AnnMatcher(gallery, index)
@@ -0,0 +1,77 @@
+# bench_ann.py
+#
+# Recall / latency of the ANN matcher against the brute-force gallery scan.
+#
+#   python -m backend.tasks.bench_ann                       # real EMBEDDING_JSON
+#   python -m backend.tasks.bench_ann --synthetic 30000 5   # 30k students x 5 embeddings
+#   python -m backend.tasks.bench_ann --backend hnswlib --ef 32 64 128
+
+import argparse
+import time
+import numpy as np
+
+from backend.tasks.gallery import Gallery
+from backend.tasks.ann_index import BACKENDS, AnnMatcher
+from backend.tasks.match_faces import COSINE_SIMILARITY_THRESHOLD, EMBEDDING_JSON
+
+
+def synthetic_gallery(n_students, per_student, dim=128, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_students, dim))
+    known = {
+        str(i): (centers[i] + 0.35 * rng.normal(size=(per_student, dim))).tolist()
+        for i in range(n_students)
+    }
+    return Gallery.from_dict(known)
+
+def make_queries(gallery, n, noise=0.3, seed=1):
+    """Perturbed copies of random gallery rows, so most queries have a true match."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(gallery.matrix), n, replace=False)
+    return gallery.matrix[rows] + noise * rng.normal(size=(n, gallery.matrix.shape[1])) / np.sqrt(gallery.matrix.shape[1])
+
+def timed(fn, queries):
+    out, t0 = [], time.perf_counter()
+    for q in queries:
+        out.append(fn(q, COSINE_SIMILARITY_THRESHOLD)[0])
+    return out, (time.perf_counter() - t0) / len(queries) * 1e3
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--synthetic", nargs=2, type=int, metavar=("STUDENTS", "PER_STUDENT"))
+    ap.add_argument("--backend", default="ivf", choices=sorted(BACKENDS))
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, nargs="+", default=[16, 64])
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    ap.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128])
+    args = ap.parse_args()
+
+    gallery = synthetic_gallery(*args.synthetic) if args.synthetic else Gallery.from_json(EMBEDDING_JSON)
+    queries = make_queries(gallery, min(args.queries, len(gallery.matrix)))
+    print(f"[bench] {len(gallery)} students, {len(gallery.matrix)} rows, {len(queries)} queries")
+
+    truth, brute_ms = timed(gallery.best_match, queries)
+    print(f"[bench] brute-force: {brute_ms:.3f} ms/query")
+
+    t0 = time.perf_counter()
+    index = BACKENDS[args.backend]().build(gallery.matrix)
+    print(f"[bench] {args.backend} build: {time.perf_counter() - t0:.2f}s")
+
+    knob, values = ("ef", args.ef) if args.backend == "hnswlib" else ("nprobe", args.nprobe)
+    print(f"{knob:>8} {'k':>5} {'recall':>8} {'ms/query':>10} {'speedup':>8}")
+    for value in values:
+        if knob == "ef":
+            index.ef = value
+            index.index.set_ef(value)
+        else:
+            index.nprobe = value
+            if args.backend == "faiss":
+                index.index.nprobe = value
+        for k in args.k:
+            got, ms = timed(AnnMatcher(gallery, index, k=k).best_match, queries)
+            recall = np.mean([a == b for a, b in zip(got, truth)])
+            print(f"{value:>8} {k:>5} {recall:>8.4f} {ms:>10.3f} {brute_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
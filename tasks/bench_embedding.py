@@ -0,0 +1,90 @@
+# bench_embedding.py
+#
+# FacenetEngine vs. the per-crop DeepFace.represent call it replaces, on the
+# same crops. Prints per-face latency and embedding parity.
+#
+#   python -m backend.tasks.bench_embedding path/to/face_crops/ --limit 64
+
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+from backend.tasks.embedding import FacenetEngine, preprocess_face, EMBED_BATCH_SIZE
+
+PARITY_ATOL = 1e-4
+
+
+def load_crops(folder, limit):
+    crops = []
+    for fn in sorted(os.listdir(folder)):
+        img = cv2.imread(os.path.join(folder, fn))
+        if img is not None:
+            crops.append(img)
+        if len(crops) >= limit:
+            break
+    return crops
+
+def represent(faces, **kwargs):
+    return np.array([
+        DeepFace.represent(f, model_name="Facenet", enforce_detection=False, **kwargs)[0]["embedding"]
+        for f in faces
+    ], dtype=np.float32)
+
+def cosine(a, b):
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def per_face_ms(fn, n, repeat=3):
+    fn()  # warm-up: model build / graph tracing
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / (repeat * n) * 1e3
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("crops_dir", help="folder of BGR face crops (any size)")
+    ap.add_argument("--limit", type=int, default=64)
+    ap.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    args = ap.parse_args()
+
+    faces = [preprocess_face(c) for c in load_crops(args.crops_dir, args.limit)]
+    if not faces:
+        sys.exit(f"no images in {args.crops_dir}")
+    n = len(faces)
+    engine = FacenetEngine()
+
+    current, current_ms = per_face_ms(lambda: represent(faces), n)
+    skipped, skipped_ms = per_face_ms(lambda: represent(faces, detector_backend="skip"), n)
+    single, single_ms = per_face_ms(lambda: np.vstack([engine.embed(f[None]) for f in faces]), n)
+    batched, batched_ms = per_face_ms(
+        lambda: np.vstack([engine.embed(np.stack(faces[i:i + args.batch_size]))
+                           for i in range(0, n, args.batch_size)]),
+        n,
+    )
+
+    print(f"[bench] {n} crops, batch size {args.batch_size}")
+    print(f"{'path':<40} {'ms/face':>8} {'speedup':>8}")
+    for name, ms in [
+        ("DeepFace.represent (current call)", current_ms),
+        ("DeepFace.represent, detector skipped", skipped_ms),
+        ("FacenetEngine, batch of one", single_ms),
+        ("FacenetEngine, batched", batched_ms),
+    ]:
+        print(f"{name:<40} {ms:>8.2f} {current_ms / ms:>7.1f}x")
+
+    max_diff = float(np.abs(batched - skipped).max())
+    print(f"[parity] vs detector-skipped represent: max |diff| {max_diff:.2e}, "
+          f"min cosine {cosine(batched, skipped).min():.6f}")
+    print(f"[parity] batch vs batch-of-one:         max |diff| {np.abs(batched - single).max():.2e}")
+    # the current call may re-crop with OpenCV's detector, so only report it
+    print(f"[parity] vs current call:               min cosine {cosine(batched, current).min():.6f}")
+    if max_diff > PARITY_ATOL:
+        sys.exit(f"[parity] FAILED: max |diff| {max_diff:.2e} > {PARITY_ATOL}")
+
+
+if __name__ == "__main__":
+    main()
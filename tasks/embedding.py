@@ -0,0 +1,109 @@
+# backend/tasks/embedding.py
+
+import os
+import cv2
+import numpy as np
+
+from backend.tasks.model_registry import registry
+from backend.tasks.inference_server import inference_client
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+FACE_SIZE        = (160, 160)
+EMBEDDING_DIM    = 128
+# faces per forward pass; short batches are padded to a power of two, so the
+# model only ever sees a few batch shapes (one traced graph per shape)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# "tf" (DeepFace's Keras model) or "onnx" (see tasks/onnx_runtime.py)
+EMBED_BACKEND    = os.getenv("EMBED_BACKEND", "tf")
+
+
+def load_facenet_model():
+    """
+    Load DeepFace's Facenet128d Keras model (weights are downloaded into
+    ~/.deepface on first use), without going through DeepFace.represent.
+    """
+    try:  # deepface >= 0.0.80
+        from deepface.models.facial_recognition.Facenet import load_facenet128d_model
+        return load_facenet128d_model()
+    except ImportError:
+        pass
+    try:  # older deepface
+        from deepface.basemodels.Facenet import loadModel
+        return loadModel()
+    except ImportError:
+        from deepface import DeepFace
+        client = DeepFace.build_model("Facenet")
+        return getattr(client, "model", client)
+
+
+class FacenetEngine:
+    """
+    Facenet forward pass for faces that are already cropped and resized.
+
+    DeepFace.represent looks the model up, re-runs a face detector on the
+    crop and resizes/pads it on every call; YOLO has done that work already,
+    so the engine only normalizes the batch and runs the model. With the
+    detector skipped, embeddings equal DeepFace.represent's within float
+    tolerance (see tasks/bench_embedding.py).
+    """
+
+    def __init__(self, model=None):
+        self.model = model if model is not None else load_facenet_model()
+
+    @staticmethod
+    def normalize(faces):
+        """(N, 160, 160, 3) RGB uint8/float faces -> float32 in [0, 1]."""
+        faces = np.asarray(faces)
+        if faces.dtype == np.uint8 or faces.max(initial=0) > 1:
+            return faces.astype(np.float32) / 255.0
+        return faces.astype(np.float32, copy=False)
+
+    def embed(self, faces):
+        """One forward pass over a batch of 160x160 RGB faces -> (N, 128) float32."""
+        return np.asarray(self.model(self.normalize(faces), training=False), dtype=np.float32)
+
+
+def _load_engine():
+    if EMBED_BACKEND == "onnx":
+        from backend.tasks.onnx_runtime import OnnxFacenetEngine
+        return OnnxFacenetEngine()
+    return FacenetEngine()
+
+registry.register("facenet", _load_engine)
+
+def get_engine():
+    """Process-wide FacenetEngine (TF or ONNX Runtime), loaded on first use."""
+    return registry.get("facenet")
+
+def preprocess_face(crop):
+    """BGR face crop -> 160x160 RGB uint8, the layout Facenet expects."""
+    return cv2.cvtColor(cv2.resize(crop, FACE_SIZE), cv2.COLOR_BGR2RGB)
+
+def embed_faces(crops, batch_size=EMBED_BATCH_SIZE):
+    """Embed BGR face crops on the shared inference server if configured, else in-process."""
+    client = inference_client()
+    if client is not None and len(crops):
+        return client.embed(crops)
+    return embed_faces_local(crops, batch_size)
+
+def embed_faces_local(crops, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed a list of BGR face crops with one Facenet forward pass per batch.
+
+    Crops are packed into batches of `batch_size`; a short final batch is
+    zero-padded to the next power of two, so only a handful of batch shapes
+    ever reach the model. The returned (len(crops), 128) float32 array is
+    aligned with `crops`.
+    """
+    out = np.zeros((len(crops), EMBEDDING_DIM), dtype=np.float32)
+    if not len(crops):
+        return out
+    engine = get_engine()
+    for start in range(0, len(crops), batch_size):
+        chunk = crops[start:start + batch_size]
+        padded = min(batch_size, 1 << (len(chunk) - 1).bit_length())
+        batch = np.zeros((padded, *FACE_SIZE, 3), dtype=np.uint8)
+        for i, crop in enumerate(chunk):
+            batch[i] = preprocess_face(crop)
+        out[start:start + len(chunk)] = engine.embed(batch)[:len(chunk)]
+    return out
@@ -0,0 +1,93 @@
+# backend/tasks/face_quality.py
+
+import os
+import threading
+from collections import Counter
+
+import cv2
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# crops failing any of these are not embedded: they rarely match and mostly
+# end up as spurious "Unknown" alerts
+QUALITY_MIN_SIZE       = int(os.getenv("QUALITY_MIN_SIZE", "32"))         # px, shorter side
+QUALITY_MIN_SHARPNESS  = float(os.getenv("QUALITY_MIN_SHARPNESS", "25"))  # Laplacian variance
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "220"))
+QUALITY_MIN_CONFIDENCE = float(os.getenv("QUALITY_MIN_CONFIDENCE", "0.5"))
+
+# sharpness is measured at a fixed size so it does not grow with crop resolution
+_PROBE_SIZE = (64, 64)
+
+
+def measure(crop):
+    """(shorter side px, Laplacian-variance sharpness, mean brightness) of a BGR crop."""
+    side = min(crop.shape[:2])
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, _PROBE_SIZE, interpolation=cv2.INTER_AREA)
+    return side, float(cv2.Laplacian(small, cv2.CV_64F).var()), float(small.mean())
+
+
+class QualityGate:
+    """
+    Cheap checks run on a crop before it is worth a Facenet pass: size,
+    blur, exposure and detection confidence. `check` returns the first
+    failed reason (and counts it) or None; `score` ranks crops so a track
+    keeps its best one, with every failing crop ranked below every passing
+    crop.
+    """
+
+    REASONS = ("too_small", "blurry", "too_dark", "too_bright", "low_confidence")
+
+    def __init__(self, min_size=QUALITY_MIN_SIZE, min_sharpness=QUALITY_MIN_SHARPNESS,
+                 min_brightness=QUALITY_MIN_BRIGHTNESS, max_brightness=QUALITY_MAX_BRIGHTNESS,
+                 min_confidence=QUALITY_MIN_CONFIDENCE):
+        self.min_size       = min_size
+        self.min_sharpness  = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_confidence = min_confidence
+        self._lock    = threading.Lock()
+        self.passed   = 0
+        self.skipped  = Counter()
+
+    def _reason(self, side, sharpness, brightness, conf):
+        if side < self.min_size:
+            return "too_small"
+        if sharpness < self.min_sharpness:
+            return "blurry"
+        if brightness < self.min_brightness:
+            return "too_dark"
+        if brightness > self.max_brightness:
+            return "too_bright"
+        if conf is not None and conf < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def check(self, crop, conf=None):
+        reason = self._reason(*measure(crop), conf)
+        with self._lock:
+            if reason is None:
+                self.passed += 1
+            else:
+                self.skipped[reason] += 1
+        return reason
+
+    def score(self, crop, bbox=None, conf=None):
+        """Quality in [0, 1] for crops that pass, below 0 for crops that do not (not counted)."""
+        side, sharpness, brightness = measure(crop)
+        value = (min(side / 160, 1.0)
+                 * min(sharpness / (4 * self.min_sharpness), 1.0)
+                 * (conf if conf is not None else 1.0))
+        return value if self._reason(side, sharpness, brightness, conf) is None else value - 1.0
+
+    def stats(self):
+        with self._lock:
+            total = self.passed + sum(self.skipped.values())
+            return {
+                "passed": self.passed,
+                "skipped": {r: self.skipped[r] for r in self.REASONS},
+                "skip_rate": round(1 - self.passed / total, 3) if total else 0.0,
+            }
+
+
+gate = QualityGate()
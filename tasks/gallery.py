@@ -0,0 +1,96 @@
+# backend/tasks/gallery.py
+
+import json
+import numpy as np
+
+
+class Gallery:
+    """
+    Enrolled student embeddings packed for vectorized cosine matching.
+
+    All embeddings are L2-normalized once and stored row-wise in a single
+    contiguous float32 matrix. `offsets[i]:offsets[i+1]` is the row range
+    belonging to `student_ids[i]`, so scoring a probe is one mat-vec product
+    followed by a segmented mean over those ranges.
+    """
+
+    def __init__(self, student_ids, matrix, offsets):
+        self.student_ids = list(student_ids)
+        self.matrix      = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.offsets     = np.asarray(offsets, dtype=np.int64)
+        self.counts      = np.diff(self.offsets)
+        # row -> index into student_ids, handy for index-based lookups
+        self.row_owner   = np.repeat(np.arange(len(self.student_ids)), self.counts)
+
+    # ─── CONSTRUCTION ────────────────────────────────────────────────────
+    @classmethod
+    def from_dict(cls, known):
+        """Build from the `{student_id: [embedding, ...]}` mapping in EMBEDDING_JSON."""
+        ids, rows, offsets = [], [], [0]
+        for sid, embs in known.items():
+            embs = np.asarray(embs, dtype=np.float32)
+            if embs.ndim != 2 or not len(embs):
+                continue
+            ids.append(sid)
+            rows.append(embs)
+            offsets.append(offsets[-1] + len(embs))
+        if not rows:
+            return cls([], np.zeros((0, 0), dtype=np.float32), [0])
+        return cls(ids, l2_normalize(np.vstack(rows)), offsets)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    # ─── SCORING ─────────────────────────────────────────────────────────
+    def score(self, probe):
+        """Mean cosine similarity of `probe` against every student, shape (n_students,)."""
+        return self.score_batch(np.asarray(probe, dtype=np.float32)[None, :])[0]
+
+    def score_batch(self, probes):
+        """Mean cosine similarity for a batch of probes, shape (n_probes, n_students)."""
+        probes = l2_normalize(np.asarray(probes, dtype=np.float32))
+        if not len(self.student_ids):
+            return np.zeros((len(probes), 0), dtype=np.float32)
+        sims = probes @ self.matrix.T
+        return np.add.reduceat(sims, self.offsets[:-1], axis=1) / self.counts
+
+    def score_students(self, probe, student_idx):
+        """Exact mean cosine of `probe` against only the students at `student_idx`."""
+        probe = l2_normalize(np.asarray(probe, dtype=np.float32))
+        student_idx = np.asarray(student_idx, dtype=np.int64)
+        if not len(student_idx):
+            return np.zeros(0, dtype=np.float32)
+        starts, counts = self.offsets[student_idx], self.counts[student_idx]
+        rows = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        sims = self.matrix[rows] @ probe
+        seg  = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        return np.add.reduceat(sims, seg) / counts
+
+    def best_match(self, probe, threshold):
+        """
+        Return (student_id, score) of the best student scoring >= threshold,
+        or (None, -1.0) when no student clears it.
+        """
+        return self.best_matches(np.asarray(probe, dtype=np.float32)[None, :], threshold)[0]
+
+    def best_matches(self, probes, threshold):
+        """Vectorized `best_match` over a batch of probes."""
+        scores = self.score_batch(probes)
+        if not scores.shape[1]:
+            return [(None, -1.0)] * len(scores)
+        best = np.argmax(scores, axis=1)
+        out = []
+        for i, j in enumerate(best):
+            s = float(scores[i, j])
+            out.append((self.student_ids[j], s) if s >= threshold else (None, -1.0))
+        return out
+
+
+def l2_normalize(x, eps=1e-10):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), eps)
@@ -0,0 +1,96 @@
+# backend/tasks/inference_executor.py
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# threads running live vision calls; torch/TF already use several cores per
+# call, so more than one or two mostly adds contention
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+# wait/run times kept for the percentiles in stats()
+METRICS_WINDOW    = 1000
+
+
+def summarize_ms(ms):
+    """mean / p95 / max of a list of durations in milliseconds."""
+    if not ms:
+        return {"mean": None, "p95": None, "max": None}
+    ordered = sorted(ms)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for CPU-bound vision calls made on behalf of the
+    event loop, so detection and embedding never run on the loop itself
+    and never compete with other blocking work (DB writes) for the default
+    executor's threads.
+
+    `stats` reports queue depth and the time calls spend waiting for a
+    thread and running, over the last METRICS_WINDOW calls.
+    """
+
+    def __init__(self, workers=INFERENCE_THREADS):
+        self.workers   = max(1, workers)
+        self._pool     = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock     = threading.Lock()
+        self._queued   = 0
+        self._running  = 0
+        self.completed = 0
+        self.failed    = 0
+        self._wait_ms  = deque(maxlen=METRICS_WINDOW)
+        self._run_ms   = deque(maxlen=METRICS_WINDOW)
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); returns a concurrent.futures.Future."""
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+        return self._pool.submit(self._call, submitted, fn, args)
+
+    def _call(self, submitted, fn, args):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued  -= 1
+            self._running += 1
+            self._wait_ms.append((started - submitted) * 1000)
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._run_ms.append((time.perf_counter() - started) * 1000)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, fn, *args):
+        """Await fn(*args) on the pool from async code."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "wait_ms": summarize_ms(list(self._wait_ms)),
+                "run_ms": summarize_ms(list(self._run_ms)),
+            }
+
+
+inference = InferenceExecutor()
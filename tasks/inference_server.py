@@ -0,0 +1,175 @@
+# backend/tasks/inference_server.py
+#
+# One model-owning process shared by every API worker.
+#
+#   python -m backend.tasks.inference_server /tmp/student-id-inference-0.sock
+#
+# or let run.py start INFERENCE_SERVERS of them. Workers find the servers
+# through INFERENCE_SOCKETS (comma-separated socket paths); when it is unset
+# detection, embedding and classification run in-process as before.
+#
+# Messages are pickles, so the socket must only accept peers that know
+# INFERENCE_AUTHKEY. There is no default: run.py generates one per run and
+# passes it to the servers and workers; set it yourself to start a server
+# by hand.
+
+import os
+import sys
+import threading
+import numpy as np
+from multiprocessing.connection import Listener, Client
+
+INFERENCE_SOCKETS = [s for s in os.getenv("INFERENCE_SOCKETS", "").split(",") if s]
+# registry artifacts loaded by the server; everything else stays in the workers
+SERVER_MODELS     = ("yolo", "facenet", "classifier")
+
+
+def authkey():
+    key = os.getenv("INFERENCE_AUTHKEY", "")
+    if not key:
+        raise RuntimeError("INFERENCE_AUTHKEY must be set to use the inference server")
+    return key.encode()
+
+def socket_paths(n, prefix="/tmp/student-id-inference"):
+    return [f"{prefix}-{i}.sock" for i in range(n)]
+
+
+# ─── SERVER ───────────────────────────────────────────────────────────────
+def _handlers():
+    # imported here so clients never pull in the model code
+    from backend.tasks.match_faces import detect_boxes, detect_boxes_batch
+    from backend.tasks.embedding import embed_faces_local
+    from backend.tasks.model_registry import registry
+    return {
+        "ping":     lambda: "pong",
+        "detect":   detect_boxes,
+        "detect_batch": detect_boxes_batch,
+        "embed":    embed_faces_local,
+        "classify": lambda embs: registry.get("classifier").predict_proba(embs),
+        "classes":  lambda: registry.get("classifier").classes,
+        "status":   lambda: registry.status(SERVER_MODELS),
+    }
+
+def _serve_connection(conn, handlers, locks):
+    with conn:
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                # one call per model at a time; the frameworks parallelize internally
+                with locks.get(op, threading.Lock()):
+                    reply = ("ok", handlers[op](*args))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                return
+
+def _accept_loop(listener, handlers, locks):
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:  # failed auth handshake etc.
+            print(f"[inference] Rejected connection: {e}")
+            continue
+        threading.Thread(target=_serve_connection, args=(conn, handlers, locks), daemon=True).start()
+
+def serve(address, key=None):
+    """Load the models once and answer requests on a Unix socket forever."""
+    from backend.tasks.model_registry import registry
+    key = key or authkey()
+    # the server itself always runs the models in-process
+    INFERENCE_SOCKETS.clear()
+    handlers = _handlers()
+    locks = {op: threading.Lock() for op in ("detect", "embed", "classify")}
+    locks["detect_batch"] = locks["detect"]
+
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, family="AF_UNIX", authkey=key) as listener:
+        os.chmod(address, 0o600)
+        # clients can connect already; they wait in the backlog until warm-up is done
+        registry.warm_up(SERVER_MODELS)
+        print(f"[inference] Serving on {address} (pid {os.getpid()})")
+        _accept_loop(listener, handlers, locks)
+
+
+# ─── CLIENT ───────────────────────────────────────────────────────────────
+class InferenceError(RuntimeError):
+    pass
+
+
+class InferenceClient:
+    """
+    Thin client for an inference server. Connections are per thread, since
+    a multiprocessing Connection must not be shared between threads.
+    """
+
+    def __init__(self, address, key=None):
+        self.address = address
+        self.key     = key or authkey()
+        self._local  = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.key)
+        return conn
+
+    def call(self, op, *args):
+        for attempt in range(2):
+            try:
+                conn = self._conn()
+                conn.send((op, args))
+                status, value = conn.recv()
+                break
+            except (EOFError, OSError):
+                # server restarted: reconnect once, then give up
+                self._local.conn = None
+                if attempt:
+                    raise
+        if status == "error":
+            raise InferenceError(f"{op} failed on {self.address}: {value}")
+        return value
+
+    def detect(self, img, conf_thres, iou_thres):
+        return self.call("detect", img, conf_thres, iou_thres)
+
+    def detect_batch(self, imgs, conf_thres, iou_thres, batch_size):
+        return self.call("detect_batch", list(imgs), conf_thres, iou_thres, batch_size)
+
+    def embed(self, crops):
+        return self.call("embed", list(crops))
+
+
+class RemoteClassifier:
+    """Same predict_proba/classes API as the local classifiers."""
+
+    def __init__(self, client):
+        self.client  = client
+        self.classes = np.asarray(client.call("classes"))
+
+    def predict_proba(self, embeddings):
+        return self.client.call("classify", np.asarray(embeddings, dtype=np.float32))
+
+
+_client = None
+
+def inference_client():
+    """The InferenceClient for this worker, or None to run models in-process."""
+    global _client
+    if _client is None and INFERENCE_SOCKETS:
+        # spread workers over the servers
+        _client = InferenceClient(INFERENCE_SOCKETS[os.getpid() % len(INFERENCE_SOCKETS)])
+    return _client
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: INFERENCE_AUTHKEY=... python -m backend.tasks.inference_server SOCKET_PATH")
+    if not os.getenv("INFERENCE_AUTHKEY"):
+        sys.exit("[inference] set INFERENCE_AUTHKEY (the same value for the server and the API workers)")
+    serve(sys.argv[1])
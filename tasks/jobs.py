@@ -0,0 +1,249 @@
+# backend/tasks/jobs.py
+
+import os
+import uuid
+import time
+import socket
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# videos processed at once by each API worker; further uploads wait in line
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+# progress is written to the database at most this often (seconds)
+PROGRESS_INTERVAL   = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))
+
+FINISHED = ("done", "failed", "cancelled")
+OWNER    = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class DbJobStore:
+    """VideoJob rows in the application database."""
+
+    def _session(self):
+        # imported here so the manager can be used without a database
+        from backend.db_config import SessionLocal
+        from backend.models.video_job_model import VideoJob
+        return SessionLocal(), VideoJob
+
+    @staticmethod
+    def _as_dict(row):
+        return {c.name: getattr(row, c.name) for c in row.__table__.columns}
+
+    def create(self, **fields):
+        session, VideoJob = self._session()
+        try:
+            session.add(VideoJob(**fields))
+            session.commit()
+        finally:
+            session.close()
+
+    def update(self, job_id, **fields):
+        session, VideoJob = self._session()
+        try:
+            session.query(VideoJob).filter(VideoJob.id == job_id).update(fields)
+            session.commit()
+        finally:
+            session.close()
+
+    def get(self, job_id):
+        session, VideoJob = self._session()
+        try:
+            row = session.query(VideoJob).get(job_id)
+            return self._as_dict(row) if row else None
+        finally:
+            session.close()
+
+    def unfinished(self):
+        session, VideoJob = self._session()
+        try:
+            rows = session.query(VideoJob).filter(VideoJob.status.notin_(FINISHED)).all()
+            return [self._as_dict(r) for r in rows]
+        finally:
+            session.close()
+
+
+class JobHandle:
+    """
+    Passed to the running job: `report` records progress and raises
+    JobCancelled once cancellation was requested, so pipelines stop at the
+    next frame boundary. `loop` is the event loop the job was submitted
+    from (the app's), which owns the dashboard sockets.
+    """
+
+    def __init__(self, job_id, store, loop=None):
+        self.id        = job_id
+        self.store     = store
+        self.loop      = loop
+        self.cancelled = threading.Event()
+        self.progress  = 0.0
+        self._written  = 0.0
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled(self.id)
+
+    def report(self, progress):
+        self.check()
+        self.progress = progress
+        now = time.monotonic()
+        if now - self._written >= PROGRESS_INTERVAL:
+            self._written = now
+            self.store.update(self.id, progress=round(progress, 4))
+
+
+class JobManager:
+    """
+    Runs uploaded-video jobs on a bounded thread pool.
+
+    Every job has a persistent record (status, progress, results, error);
+    at most `max_workers` run at once and the rest wait in FIFO order. The
+    queue itself lives in this process, so `queue_position` is only known
+    to the worker that accepted the upload; other workers still see the
+    stored status and progress.
+    """
+
+    def __init__(self, run, max_workers=MAX_CONCURRENT_JOBS, store=None):
+        self.run      = run
+        self.store    = store if store is not None else DbJobStore()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self._lock    = threading.Lock()
+        self._queued  = []   # job ids in submission order
+        self._handles = {}
+        self._futures = {}
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def submit(self, video_path, filename, mode, job_id=None):
+        job_id = job_id or self.new_id()
+        self.store.create(
+            id=job_id, filename=filename, video_path=video_path, mode=mode,
+            status="queued", progress=0.0, owner=OWNER,
+        )
+        handle = JobHandle(job_id, self.store, _running_loop())
+        with self._lock:
+            self._queued.append(job_id)
+            self._handles[job_id] = handle
+            self._futures[job_id] = self.executor.submit(self._execute, handle, video_path, mode)
+        return job_id
+
+    def _execute(self, handle, video_path, mode):
+        with self._lock:
+            self._queued.remove(handle.id)
+        try:
+            if handle.cancelled.is_set():
+                self._finish(handle.id, "cancelled")
+                return
+            self.store.update(handle.id, status="running", started_at=datetime.utcnow())
+            try:
+                results = self.run(video_path, mode, handle)
+            except JobCancelled:
+                self._finish(handle.id, "cancelled", progress=handle.progress)
+            except Exception as e:
+                print(f"[jobs] {handle.id} failed: {type(e).__name__}: {e}")
+                self._finish(handle.id, "failed", progress=handle.progress, error=f"{type(e).__name__}: {e}")
+            else:
+                if self._detach(handle):
+                    self._finish(handle.id, "done", progress=1.0, results=results)
+                else:  # cancelled after its last check; the caller was told so
+                    self._finish(handle.id, "cancelled", progress=handle.progress)
+        finally:
+            self._detach(handle)
+
+    def _detach(self, handle):
+        """Stop accepting cancellation for a job; True if it was not cancelled."""
+        with self._lock:
+            self._handles.pop(handle.id, None)
+            self._futures.pop(handle.id, None)
+            return not handle.cancelled.is_set()
+
+    def _finish(self, job_id, status, **fields):
+        self.store.update(job_id, status=status, finished_at=datetime.utcnow(), **fields)
+
+    def get(self, job_id):
+        """The job record plus its queue position, or None if unknown."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job_id in self._queued:
+                job["queue_position"] = self._queued.index(job_id) + 1
+            handle = self._handles.get(job_id)
+        if handle is not None and job["status"] == "running":
+            job["progress"] = max(job["progress"], handle.progress)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job is dropped at once; a running one stops
+        at its next progress report and ends "cancelled" even if it has no
+        further report. Returns False if the job is not live in this
+        process (unknown, finished or finishing, or owned by another worker).
+        """
+        with self._lock:
+            handle = self._handles.get(job_id)
+            future = self._futures.get(job_id)
+            if handle is None:
+                return False
+            handle.cancelled.set()
+            if future.cancel():
+                self._queued.remove(job_id)
+                self._handles.pop(job_id)
+                self._futures.pop(job_id)
+            else:
+                return True
+        self._finish(job_id, "cancelled")
+        return True
+
+    def recover(self):
+        """
+        Fail unfinished jobs whose owning process on this host is gone, e.g.
+        after a restart; they would otherwise stay queued/running forever.
+        """
+        host = socket.gethostname()
+        for job in self.store.unfinished():
+            owner_host, _, pid = (job.get("owner") or "").rpartition(":")
+            if owner_host != host or not pid.isdigit():
+                continue  # another machine's job
+            if int(pid) == os.getpid():
+                if job["id"] in self._handles:
+                    continue
+            elif _pid_alive(int(pid)):
+                continue
+            self._finish(job["id"], "failed", error="interrupted: the worker processing it exited")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_video_job(video_path, mode, job):
+    """Default job body: the full detect-and-match pipeline, in its own event loop."""
+    from backend.tasks.match_faces import detect_and_match
+    return asyncio.run(detect_and_match(video_path, mode, job=job))
+
+
+jobs = JobManager(run_video_job)
@@ -0,0 +1,107 @@
+# backend/tasks/live_batcher.py
+
+import os
+import time
+import asyncio
+from collections import deque
+
+from backend.tasks.inference_executor import summarize_ms, METRICS_WINDOW
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# frames from all live cameras are batched through detection + embedding:
+# a batch closes after LIVE_BATCH_MAX frames or LIVE_BATCH_WAIT_MS, whichever
+# comes first (LIVE_BATCH_MAX=1 turns batching off)
+LIVE_BATCH_MAX     = int(os.getenv("LIVE_BATCH_MAX", "8"))
+LIVE_BATCH_WAIT_MS = float(os.getenv("LIVE_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Shared scheduler that turns many callers' `submit(item)` calls into
+    `fn(items)` batches, at most `max_inflight` running at once via `run`.
+    """
+
+    def __init__(self, fn, max_batch=LIVE_BATCH_MAX, max_wait=LIVE_BATCH_WAIT_MS / 1000,
+                 run=asyncio.to_thread, max_inflight=1):
+        self.fn        = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait  = max_wait
+        self.run       = run
+        self.max_inflight = max(1, max_inflight)
+        self._slots    = None
+        self._queue    = asyncio.Queue()
+        self._task     = None
+        self.batches   = 0
+        self.items     = 0
+        self._wait_ms  = deque(maxlen=METRICS_WINDOW)
+
+    async def submit(self, item):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        while True:
+            # no point closing a batch while nothing could run it
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # callers that went away (closed sockets) are not worth computing for
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                self._slots.release()
+                continue
+            loop.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        self._wait_ms.extend((started - submitted) * 1000 for _, _, submitted in batch)
+        try:
+            outcomes = await self._outcomes([item for item, _, _ in batch])
+        finally:
+            self._slots.release()
+        self.batches += 1
+        self.items   += len(batch)
+        for (_, fut, _), (ok, value) in zip(batch, outcomes):
+            if fut.done():
+                continue
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+    async def _outcomes(self, items):
+        """
+        (ok, result or exception) per item. When a batch fails its items
+        are retried one by one, so a bad frame fails only its own caller.
+        """
+        try:
+            return [(True, result) for result in await self.run(self.fn, items)]
+        except Exception as e:
+            if len(items) == 1:
+                return [(False, e)]
+        outcomes = []
+        for item in items:
+            outcomes += await self._outcomes([item])
+        return outcomes
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "frames": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "wait_ms": summarize_ms(list(self._wait_ms)),
+        }
@@ -4,84 +4,122 @@ import os
 import sys
 import cv2
 import json
-import torch
 import asyncio
 import numpy as np
-import joblib
-
-from collections import Counter
-from deepface import DeepFace
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import InputLayer
-from tensorflow.keras.mixed_precision import Policy as DTypePolicy
-import albumentations as A
 
 from backend.ws_broadcast import broadcast_event
 from backend.alerts_utils import push_alert_to_db  # ← our new helper
+from backend.tasks.gallery import Gallery
+from backend.tasks.ann_index import build_matcher
+from backend.tasks.embedding import embed_faces
+from backend.tasks.tta import adaptive_tta
+from backend.tasks.mlp_runtime import load_classifier
+from backend.tasks.model_registry import registry
+from backend.tasks.inference_server import inference_client, RemoteClassifier
+from backend.tasks.video_frames import (
+    iter_frames, iter_detections, frame_count, AdaptiveSampler, job_scratch, dump_dirs,
+    SAMPLE_EVERY_N, SAMPLE_ADAPTIVE,
+)
+from backend.tasks.sharded_video import sharded_detections, SHARD_WORKERS
+from backend.tasks.tracker import track_faces, iou_matrix
+from backend.tasks.face_quality import gate
 
 # ─── CONFIG ───────────────────────────────────────────────────────────────
+YOLO_DIR           = "/home/ayombalima/YOLO-FaceV2-master"
 YOLO_WEIGHTS       = "/home/ayombalima/YOLO-FaceV2-master/yolov5s_v2.pt"
 EMBEDDING_JSON     = "/home/ayombalima/YOLO-FaceV2-master/augmented_student_embeddings3.json"
 CLUSTER_JSON       = "/home/ayombalima/ml_models/final_clustered_results.json"
-ML_MODEL_PATH      = "/home/ayombalima/ml_models/student_recognition_model.h5"
-SCALER_PATH        = "/home/ayombalima/ml_models/scaler.pkl"
-LABEL_ENCODER_PATH = "/home/ayombalima/ml_models/label_encoder.pkl"
 
-EXTRACTED_DIR = "extracted_frames"
-RESIZED_DIR   = "resized_frames"
-DETECTED_DIR  = "detected_faces"
-MATCHED_DIR   = "matched_faces"
-for d in (EXTRACTED_DIR, RESIZED_DIR, DETECTED_DIR, MATCHED_DIR):
-    os.makedirs(d, exist_ok=True)
+# live cameras reuse an identity, and alert once per student, within this window
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "10"))  # seconds
 
-DEDUP_WINDOW = 10  # seconds
+# YOLO input size; frames per forward pass when detecting several at once
+DETECT_SIZE       = 640
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "8"))
+# "torch" (YOLO-FaceV2 checkpoint) or "onnx" (see tasks/onnx_runtime.py)
+DETECT_BACKEND    = os.getenv("DETECT_BACKEND", "torch")
+# share of a job's progress bar spent on decode + detection; identification is the rest
+DETECT_PROGRESS   = 0.9
 
 # ─── THRESHOLDS ────────────────────────────────────────────────────────────
 ML_CONFIDENCE_THRESHOLD      = 0.80
 COSINE_SIMILARITY_THRESHOLD  = 0.75
 
-# ─── YOLO / TORCH SETUP ───────────────────────────────────────────────────
-sys.path.append("/home/ayombalima/YOLO-FaceV2-master")
-from models.experimental import attempt_load
-from utils.general       import non_max_suppression, scale_coords
-from utils.torch_utils   import select_device
-
-device     = select_device("cpu")
-yolo_model = attempt_load(YOLO_WEIGHTS, map_location=device).eval()
-
-class CustomInputLayer(InputLayer):
-    def __init__(self, *args, **kwargs):
-        bs = kwargs.pop("batch_shape", None)
-        if bs is not None:
-            kwargs["batch_input_shape"] = bs
-        super().__init__(*args, **kwargs)
-
-ml_model      = load_model(
-    ML_MODEL_PATH,
-    compile=False,
-    safe_mode=False,
-    custom_objects={"InputLayer": CustomInputLayer, "DTypePolicy": DTypePolicy}
-)
-scaler        = joblib.load(SCALER_PATH)
-label_encoder = joblib.load(LABEL_ENCODER_PATH)
-
-with open(CLUSTER_JSON) as f:
-    clusters_map = json.load(f).get("clusters", {})
-
-# ─── AUGMENTATIONS ────────────────────────────────────────────────────────
-aug_pipeline = A.Compose([
-    A.HorizontalFlip(p=0.5),
-    A.Rotate(limit=15, p=0.6),
-    A.RandomBrightnessContrast(p=0.6),
-    A.GaussNoise(p=0.2),
-    A.HueSaturationValue(p=0.3),
-    A.RandomShadow(p=0.2),
-])
+# ─── MODEL LOADERS ────────────────────────────────────────────────────────
+# Nothing heavy is loaded at import: the registry loads each artifact on
+# first use, or up front via registry.warm_up() (see routes/health.py).
+class TorchYolo:
+    """YOLO-FaceV2 checkpoint on torch; same `detect` as onnx_runtime.OnnxYolo."""
+
+    def __init__(self, weights=YOLO_WEIGHTS, device="cpu"):
+        sys.path.append(YOLO_DIR)
+        from models.experimental import attempt_load
+        from utils.torch_utils   import select_device
+        self.device = select_device(device)
+        self.model  = attempt_load(weights, map_location=self.device).eval()
+
+    def detect(self, batch, shapes, conf_thres=0.25, iou_thres=0.45):
+        """One (N, 5) x1, y1, x2, y2, conf array per frame, in the pixels of `shapes`."""
+        import torch
+        from utils.general import non_max_suppression, scale_coords
+        tensor = (
+            torch.from_numpy(batch)
+                 .permute(0,3,1,2).float().div(255.0)
+                 .to(self.device)
+        )
+        with torch.no_grad():
+            preds = non_max_suppression(
+                self.model(tensor)[0],
+                conf_thres=conf_thres,
+                iou_thres=iou_thres
+            )
+        out = []
+        for dets, shape in zip(preds, shapes):
+            if dets is None or len(dets) == 0:
+                out.append(np.zeros((0, 5), dtype=np.float32))
+                continue
+            dets[:, :4] = scale_coords(tensor.shape[2:], dets[:, :4], shape).round()
+            out.append(dets[:, :5].cpu().numpy())
+        return out
+
+def _load_yolo():
+    if DETECT_BACKEND == "onnx":
+        from backend.tasks.onnx_runtime import OnnxYolo
+        return OnnxYolo()
+    return TorchYolo()
+
+def _load_clusters():
+    with open(CLUSTER_JSON) as f:
+        return json.load(f).get("clusters", {})
+
+def _load_augmentations():
+    import albumentations as A
+    return A.Compose([
+        A.HorizontalFlip(p=0.5),
+        A.Rotate(limit=15, p=0.6),
+        A.RandomBrightnessContrast(p=0.6),
+        A.GaussNoise(p=0.2),
+        A.HueSaturationValue(p=0.3),
+        A.RandomShadow(p=0.2),
+    ])
+
+def _load_classifier():
+    client = inference_client()
+    if client is not None:
+        return RemoteClassifier(client)
+    # NumPy MLP when exported (see tasks/mlp_runtime.py), otherwise Keras
+    return load_classifier()
+
+registry.register("yolo", _load_yolo)
+registry.register("classifier", _load_classifier)
+registry.register("matcher", lambda: build_matcher(Gallery.from_json(EMBEDDING_JSON), EMBEDDING_JSON))
+registry.register("clusters", _load_clusters)
+registry.register("augmentations", _load_augmentations)
 
 # ─── HELPERS ──────────────────────────────────────────────────────────────
 def map_student_id_to_images(student_id):
     paths = []
-    for _, items in clusters_map.items():
+    for _, items in registry.get("clusters").items():
         for item in items:
             if item.get("student_id") == student_id:
                 p = item.get("image_path")
@@ -92,86 +130,150 @@ def map_student_id_to_images(student_id):
     return paths
 
 def iou(boxA, boxB):
-    xA = max(boxA[0], boxB[0])
-    yA = max(boxA[1], boxB[1])
-    xB = min(boxA[2], boxB[2])
-    yB = min(boxA[3], boxB[3])
-    inter = max(0, xB - xA) * max(0, yB - yA)
-    areaA = (boxA[2]-boxA[0]) * (boxA[3]-boxA[1])
-    areaB = (boxB[2]-boxB[0]) * (boxB[3]-boxB[1])
-    if areaA + areaB - inter == 0:
-        return 0
-    return inter / (areaA + areaB - inter)
-
-def detect_faces(img, conf_thres=0.25, iou_thres=0.45):
-    tensor = (
-        torch.from_numpy(img)
-             .permute(2,0,1).float().div(255.0)
-             .unsqueeze(0).to(device)
-    )
-    with torch.no_grad():
-        dets = non_max_suppression(
-            yolo_model(tensor)[0],
-            conf_thres=conf_thres,
-            iou_thres=iou_thres
-        )[0]
-    if dets is None or len(dets) == 0:
-        return []
-    dets[:, :4] = scale_coords(tensor.shape[2:], dets[:, :4], img.shape).round()
+    return float(iou_matrix(boxA, boxB)[0, 0])
+
+def letterbox(img, size=DETECT_SIZE, color=(114, 114, 114)):
+    """Resize keeping aspect ratio and pad, centred, to size x size (YOLOv5 convention)."""
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = round(h * r), round(w * r)
+    if (nh, nw) != (h, w):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    if (nh, nw) == (size, size):
+        return img
+    return cv2.copyMakeBorder(img, top, size - nh - top, left, size - nw - left,
+                              cv2.BORDER_CONSTANT, value=color)
+
+def detect_boxes_batch(imgs, conf_thres=0.25, iou_thres=0.45, batch_size=DETECT_BATCH_SIZE):
+    """
+    Run YOLO (whichever backend DETECT_BACKEND registered) in this process
+    over a list of frames, `batch_size` letterboxed frames per forward pass.
+    Returns one (N, 5) float array of x1, y1, x2, y2, conf per frame, in
+    that frame's pixels.
+    """
+    yolo = registry.get("yolo")
+    out = []
+    for start in range(0, len(imgs), batch_size):
+        chunk = imgs[start:start + batch_size]
+        # channels stay BGR, as the model has always been fed
+        batch = np.stack([letterbox(img) for img in chunk])
+        out += yolo.detect(batch, [img.shape for img in chunk], conf_thres, iou_thres)
+    return out
+
+def detect_boxes(img, conf_thres=0.25, iou_thres=0.45):
+    """Run YOLO in this process on one frame."""
+    return detect_boxes_batch([img], conf_thres, iou_thres)[0]
+
+def _crop_faces(img, boxes):
     faces = []
-    for d in dets:
+    for d in boxes:
         x1,y1,x2,y2 = map(int, d[:4])
         crop = img[y1:y2, x1:x2]
         if crop.size:
-            faces.append((crop, (x1,y1,x2,y2)))
+            faces.append((crop, (x1,y1,x2,y2), float(d[4])))
     return faces
 
-def extract_and_resize(video_path, interval=60):
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise RuntimeError(f"Cannot open video: {video_path}")
-    fid, saved = 0, 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if fid % interval == 0:
-            name = f"frame{fid}.jpg"
-            rot  = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-            cv2.imwrite(os.path.join(EXTRACTED_DIR, name), rot)
-            small = cv2.resize(rot, (640,640))
-            cv2.imwrite(os.path.join(RESIZED_DIR,   name), small)
-            saved += 1
-        fid += 1
-    cap.release()
-    print(f"[extract] Extracted {saved} frames.")
+def detect_faces(img, conf_thres=0.25, iou_thres=0.45):
+    client = inference_client()
+    if client is not None:
+        boxes = client.detect(img, conf_thres, iou_thres)
+    else:
+        boxes = detect_boxes(img, conf_thres, iou_thres)
+    return _crop_faces(img, boxes)
+
+def detect_faces_batch(imgs, conf_thres=0.25, iou_thres=0.45, batch_size=DETECT_BATCH_SIZE):
+    """detect_faces for a list of frames, batched through YOLO; one face list per frame."""
+    if not len(imgs):
+        return []
+    client = inference_client()
+    if client is not None:
+        all_boxes = client.detect_batch(imgs, conf_thres, iou_thres, batch_size)
+    else:
+        all_boxes = detect_boxes_batch(imgs, conf_thres, iou_thres, batch_size)
+    return [_crop_faces(img, boxes) for img, boxes in zip(imgs, all_boxes)]
+
+def video_frames(video_path, interval=SAMPLE_EVERY_N, scratch=None, sampler=None):
+    """
+    Sampled, upright 640x640 frames of a video, decoded in memory: every
+    `interval` frames, or as an AdaptiveSampler decides.
+    """
+    dump = dump_dirs(scratch) if scratch else None
+    return iter_frames(video_path, interval, dump_dirs=dump, sampler=sampler)
+
+def video_detections(video_path, job=None, scratch=None):
+    """
+    (frame_id, faces) for the sampled frames of a video, in frame order.
+    Long videos are decoded and detected in parallel shards when
+    SHARD_WORKERS > 1 (see tasks/sharded_video.py). With SAMPLE_ADAPTIVE
+    the sampling rate follows motion and faces (see AdaptiveSampler).
+
+    With a job handle, progress is reported per sampled frame (per shard
+    when sharded), which is also where a cancelled job stops.
+    """
+    if SHARD_WORKERS > 1:
+        report = (lambda done: job.report(DETECT_PROGRESS * done)) if job is not None else None
+        dump = dump_dirs(scratch) if scratch else None
+        return sharded_detections(video_path, progress=report, dump_dirs=dump)
+    sampler = AdaptiveSampler.for_video(video_path) if SAMPLE_ADAPTIVE else None
+    frames = video_frames(video_path, scratch=scratch, sampler=sampler)
+    detections = ((fid, faces) for fid, _, faces in
+                  iter_detections(frames, detect_faces_batch, DETECT_BATCH_SIZE, sampler))
+    if job is None:
+        return detections
+    return _reporting(detections, job, frame_count(video_path))
+
+def _reporting(detections, job, n_frames):
+    for fid, faces in detections:
+        job.report(DETECT_PROGRESS * min(fid / n_frames, 1.0) if n_frames else 0.0)
+        yield fid, faces
+
+def quality_tracks(video_path, job=None, scratch=None):
+    """
+    Face tracks of a video, each keeping its best-quality crop, minus the
+    tracks whose best crop still fails the quality gate (never embedded).
+    """
+    tracks = track_faces(video_detections(video_path, job, scratch), quality=gate.score)
+    kept = [tr for tr in tracks if gate.check(tr.best_crop, tr.best_conf) is None]
+    if len(kept) < len(tracks):
+        print(f"[quality] Skipped {len(tracks) - len(kept)} of {len(tracks)} tracks: {gate.stats()['skipped']}")
+    return kept
+
+def job_broadcast(evt, job=None):
+    """
+    Schedule `evt` for the dashboard sockets. They belong to the app's event
+    loop while jobs run on their own thread and loop, so the send is handed
+    to the loop the job was submitted from. Returns the concurrent future,
+    or None when there is no such loop (then broadcast directly).
+    """
+    loop = getattr(job, "loop", None)
+    if loop is None or loop.is_closed():
+        return None
+    return asyncio.run_coroutine_threadsafe(broadcast_event(evt), loop)
+
+def extract_and_resize(video_path, out_dir, interval=SAMPLE_EVERY_N):
+    """Write the sampled frames to the dump_dirs of out_dir, for debugging."""
+    for _ in iter_frames(video_path, interval, dump_dirs=dump_dirs(out_dir)):
+        pass
 
 # ─── COSINE PIPELINE ──────────────────────────────────────────────────────
-async def full_cosine_pipeline(video_path):
+async def full_cosine_pipeline(video_path, job=None, scratch=None):
     print("[cosine] Starting cosine-matching…")
-    extract_and_resize(video_path)
-    with open(EMBEDDING_JSON) as f:
-        known = json.load(f)
-
-    tracks = []
-    for fn in sorted(os.listdir(RESIZED_DIR)):
-        img = cv2.imread(os.path.join(RESIZED_DIR, fn))
-        faces = detect_faces(img)
-        for crop, bbox in faces:
-            if not any(iou(tr['bbox'], bbox) > 0.5 for tr in tracks):
-                tracks.append({'bbox': bbox, 'crop': crop})
-
-    for tr in tracks:
-        emb = DeepFace.represent(
-            cv2.cvtColor(cv2.resize(tr['crop'], (160,160)), cv2.COLOR_BGR2RGB),
-            model_name="Facenet", enforce_detection=False
-        )[0]['embedding']
-
-        best_id, best_score = None, -1
-        for sid, embs in known.items():
-            score = np.mean([np.dot(emb,e)/(np.linalg.norm(emb)*np.linalg.norm(e)) for e in embs])
-            if score >= COSINE_SIMILARITY_THRESHOLD and score > best_score:
-                best_id, best_score = sid, score
+    # the gallery (and its ANN index) is built once per process and shared with the live path
+    matcher = registry.get("matcher")
+
+    tracks = quality_tracks(video_path, job, scratch)
+    print(f"[cosine] {len(tracks)} face tracks")
+    if job is not None:
+        job.report(DETECT_PROGRESS)
+
+    # one identification per track, from its best crop
+    embeddings = embed_faces([tr.best_crop for tr in tracks])
+    events = []
+    for k, (tr, emb) in enumerate(zip(tracks, embeddings)):
+        if job is not None:  # a cancelled job stores no further alerts
+            job.report(DETECT_PROGRESS + (1 - DETECT_PROGRESS) * k / len(tracks))
+        best_id, best_score = matcher.best_match(emb, COSINE_SIMILARITY_THRESHOLD)
 
         evt = {
             "type": "success" if best_id else "warning",
@@ -182,67 +284,68 @@ async def full_cosine_pipeline(video_path):
 
         evt = push_alert_to_db(evt)
         print(f"[cosine] Broadcasting (DB id={evt['id']}): {evt}")
-        await broadcast_event(evt)
+        sent = job_broadcast(evt, job)
+        await (asyncio.wrap_future(sent) if sent is not None else broadcast_event(evt))
+        events.append(evt)
 
     print("[cosine] Completed.")
+    return events
 
 # ─── MLP PIPELINE ─────────────────────────────────────────────────────────
-def run_ml_pipeline(video_path):
+def run_ml_pipeline(video_path, job=None, scratch=None):
     print("[ml] Starting ML classification…")
-    extract_and_resize(video_path)
-
-    tracks = []
-    for fn in sorted(os.listdir(RESIZED_DIR)):
-        img = cv2.imread(os.path.join(RESIZED_DIR, fn))
-        faces = detect_faces(img)
-        for crop, bbox in faces:
-            # fixed: wrap generator in list for np.mean
-            if not any(np.mean([min(b1,b2) for b1,b2 in zip(tr['bbox'], bbox)]) > 0.5 for tr in tracks):
-                tracks.append({'bbox': bbox, 'crop': crop})
+    tracks = quality_tracks(video_path, job, scratch)
+    print(f"[ml] {len(tracks)} face tracks")
 
     if not tracks:
         print("[ml] No faces found—skipping.")
-        return
-
-    for tr in tracks:
-        votes = []
-        for _ in range(5):
-            aug = aug_pipeline(image=tr['crop'])["image"]
-            face160 = cv2.resize(aug, (160,160))
-            emb = DeepFace.represent(
-                cv2.cvtColor(face160, cv2.COLOR_BGR2RGB),
-                model_name="Facenet", enforce_detection=False
-            )[0]["embedding"]
-
-            emb_s = scaler.transform([emb])
-            probs = ml_model.predict(emb_s, verbose=0)[0]
-            cid = int(np.argmax(probs))
-            sid = label_encoder.inverse_transform([cid])[0]
-            votes.append((sid, probs[cid]))
-
-        final_sid = Counter([v[0] for v in votes]).most_common(1)[0][0]
-        avg_confidence = np.mean([conf for sid, conf in votes if sid == final_sid])
+        return []
+    if job is not None:
+        job.report(DETECT_PROGRESS)
+
+    classifier   = registry.get("classifier")
+    aug_pipeline = registry.get("augmentations")
+    # each TTA round sends all undecided tracks through every stage as one batch
+    winners, confidences, n_augs = adaptive_tta(
+        [tr.best_crop for tr in tracks],
+        augment=lambda crop: aug_pipeline(image=crop)["image"],
+        classify=lambda imgs: classifier.predict_proba(embed_faces(imgs)),
+        threshold=ML_CONFIDENCE_THRESHOLD,
+    )
+    sids = classifier.classes[winners]
+    print(f"[ml] TTA used {int(n_augs.sum())} augmentations for {len(tracks)} tracks")
 
+    events = []
+    for k, (final_sid, avg_confidence, n_aug) in enumerate(zip(sids, confidences, n_augs)):
+        if job is not None:  # a cancelled job stores no further alerts
+            job.report(DETECT_PROGRESS + (1 - DETECT_PROGRESS) * k / len(sids))
         evt = {
             "type": "success" if avg_confidence >= ML_CONFIDENCE_THRESHOLD else "warning",
             "student": f"Student #{final_sid}" if avg_confidence >= ML_CONFIDENCE_THRESHOLD else "Unknown",
             "location": "Ashesi Main Campus Entrance",
-            "confidence": float(avg_confidence)
+            "confidence": float(avg_confidence),
+            "augmentations": int(n_aug),
         }
 
         evt = push_alert_to_db(evt)
         print(f"[ml] Broadcasting (DB id={evt['id']}): {evt}")
-        asyncio.run(broadcast_event(evt))
+        sent = job_broadcast(evt, job)
+        if sent is not None:
+            sent.result()
+        else:
+            asyncio.run(broadcast_event(evt))
+        events.append(evt)
+    return events
 
 # ─── DISPATCH ────────────────────────────────────────────────────────────
-async def detect_and_match(video_path, mode="matching"):
-    # Clean up old frames
-    for d in (EXTRACTED_DIR, RESIZED_DIR, DETECTED_DIR, MATCHED_DIR):
-        for f in os.listdir(d):
-            os.remove(os.path.join(d, f))
-
+async def detect_and_match(video_path, mode="matching", job=None):
+    """
+    Run one uploaded video through the chosen pipeline; returns its alert
+    events. Nothing is shared on disk between jobs, so any number can run
+    at once.
+    """
     print(f"[dispatch] mode={mode}")
-    if mode == "ml":
-        await asyncio.to_thread(run_ml_pipeline, video_path)
-    else:
-        await full_cosine_pipeline(video_path)
+    with job_scratch(job.id if job is not None else None) as scratch:
+        if mode == "ml":
+            return await asyncio.to_thread(run_ml_pipeline, video_path, job, scratch)
+        return await full_cosine_pipeline(video_path, job, scratch)
@@ -0,0 +1,179 @@
+# backend/tasks/mlp_runtime.py
+#
+# Student classifier without TensorFlow at serving time.
+#
+#   python -m backend.tasks.mlp_runtime export   # once, after (re)training
+#
+# The export reads the Keras MLP, scaler and label encoder and writes their
+# dense weights to ML_NUMPY_PATH, with the scaler folded into the first layer
+# and any BatchNormalization folded into the following Dense layer.
+
+import os
+import sys
+import numpy as np
+
+ML_MODEL_PATH      = "/home/ayombalima/ml_models/student_recognition_model.h5"
+SCALER_PATH        = "/home/ayombalima/ml_models/scaler.pkl"
+LABEL_ENCODER_PATH = "/home/ayombalima/ml_models/label_encoder.pkl"
+ML_NUMPY_PATH      = os.getenv("ML_NUMPY_PATH", "/home/ayombalima/ml_models/student_recognition_model.npz")
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+ACTIVATIONS = {
+    "linear":  lambda x: x,
+    "relu":    lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh":    np.tanh,
+    "elu":     lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    "selu":    lambda x: 1.0507009873554805 * np.where(x > 0, x, 1.6732632423543772 * np.expm1(np.minimum(x, 0))),
+    "swish":   lambda x: x / (1 + np.exp(-x)),
+    "softmax": _softmax,
+}
+
+
+# ─── RUNTIMES ─────────────────────────────────────────────────────────────
+class NumpyClassifier:
+    """
+    Dense MLP evaluated in NumPy. Takes raw Facenet embeddings (the scaler
+    is folded into the first layer) and returns class probabilities.
+    """
+
+    def __init__(self, layers, classes):
+        self.layers  = [(np.asarray(W, np.float32), np.asarray(b, np.float32), act) for W, b, act in layers]
+        # LabelEncoder keeps classes as an object array; store them as plain str/int
+        self.classes = np.asarray(np.asarray(classes).tolist())
+        for _, _, act in self.layers:
+            if act not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {act}")
+
+    @classmethod
+    def load(cls, path=ML_NUMPY_PATH):
+        data = np.load(path, allow_pickle=False)
+        n = int(data["n_layers"])
+        layers = [(data[f"W{i}"], data[f"b{i}"], str(data[f"act{i}"])) for i in range(n)]
+        return cls(layers, data["classes"])
+
+    def save(self, path=ML_NUMPY_PATH):
+        arrays = {"n_layers": len(self.layers), "classes": self.classes}
+        for i, (W, b, act) in enumerate(self.layers):
+            arrays[f"W{i}"], arrays[f"b{i}"], arrays[f"act{i}"] = W, b, act
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    def predict_proba(self, embeddings):
+        x = np.asarray(embeddings, dtype=np.float32)
+        for W, b, act in self.layers:
+            x = ACTIVATIONS[act](x @ W + b)
+        return x
+
+
+class KerasClassifier:
+    """The original Keras model + scaler + label encoder behind the same API."""
+
+    def __init__(self, model, scaler, label_encoder):
+        self.model   = model
+        self.scaler  = scaler
+        self.classes = np.asarray(label_encoder.classes_)
+
+    def predict_proba(self, embeddings):
+        return self.model.predict(self.scaler.transform(np.asarray(embeddings)), verbose=0)
+
+
+def load_keras_model(path=ML_MODEL_PATH):
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.layers import InputLayer
+    from tensorflow.keras.mixed_precision import Policy as DTypePolicy
+
+    class CustomInputLayer(InputLayer):
+        def __init__(self, *args, **kwargs):
+            bs = kwargs.pop("batch_shape", None)
+            if bs is not None:
+                kwargs["batch_input_shape"] = bs
+            super().__init__(*args, **kwargs)
+
+    return load_model(
+        path,
+        compile=False,
+        safe_mode=False,
+        custom_objects={"InputLayer": CustomInputLayer, "DTypePolicy": DTypePolicy}
+    )
+
+def load_keras_classifier():
+    import joblib
+    return KerasClassifier(load_keras_model(), joblib.load(SCALER_PATH), joblib.load(LABEL_ENCODER_PATH))
+
+def load_classifier():
+    """The exported NumPy classifier if present, else the Keras one."""
+    if os.path.exists(ML_NUMPY_PATH):
+        print(f"[mlp] Using NumPy classifier from {ML_NUMPY_PATH}")
+        return NumpyClassifier.load(ML_NUMPY_PATH)
+    print("[mlp] No exported classifier found, loading Keras model")
+    return load_keras_classifier()
+
+
+# ─── EXPORT ───────────────────────────────────────────────────────────────
+def export_classifier(model, scaler, classes):
+    """Fold a Keras Sequential MLP and its StandardScaler into a NumpyClassifier over `classes`."""
+    # pending affine x -> x * scale + shift, applied to the next Dense layer's input
+    dim = model.input_shape[-1]
+    mean  = getattr(scaler, "mean_", None)
+    std   = getattr(scaler, "scale_", None)
+    scale = 1.0 / std if std is not None else np.ones(dim)
+    shift = -mean * scale if mean is not None else np.zeros(dim)
+
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in ("InputLayer", "CustomInputLayer", "Dropout", "Flatten", "GaussianNoise"):
+            continue
+        if kind == "Dense":
+            weights = [np.asarray(w, np.float64) for w in layer.get_weights()]
+            W = weights[0]
+            b = weights[1] if len(weights) > 1 else np.zeros(W.shape[1])
+            if scale is not None:
+                b = b + shift @ W
+                W = scale[:, None] * W
+                scale = shift = None
+            layers.append([W, b, layer.get_config()["activation"]])
+        elif kind == "BatchNormalization":
+            gamma, beta, mu, var = [np.asarray(w, np.float64) for w in layer.get_weights()]
+            s = gamma / np.sqrt(var + layer.epsilon)
+            t = beta - mu * s
+            if scale is None:
+                scale, shift = s, t
+            else:
+                scale, shift = scale * s, shift * s + t
+        elif kind == "Activation":
+            act = layer.get_config()["activation"]
+            if not layers or layers[-1][2] != "linear" or scale is not None:
+                raise ValueError(f"Cannot fold Activation layer {layer.name}")
+            layers[-1][2] = act
+        else:
+            raise ValueError(f"Unsupported layer for NumPy export: {layer.name} ({kind})")
+    if scale is not None:
+        layers.append([np.diag(scale), shift, "linear"])
+    return NumpyClassifier([tuple(l) for l in layers], classes)
+
+def export(path=ML_NUMPY_PATH, n_check=256):
+    keras_clf = load_keras_classifier()
+    np_clf = export_classifier(keras_clf.model, keras_clf.scaler, keras_clf.classes)
+    # parity check on embeddings drawn around the scaler's training distribution
+    rng = np.random.default_rng(0)
+    probes = keras_clf.scaler.mean_ + keras_clf.scaler.scale_ * rng.normal(size=(n_check, len(keras_clf.scaler.mean_)))
+    ref, got = keras_clf.predict_proba(probes), np_clf.predict_proba(probes)
+    max_diff = float(np.abs(ref - got).max())
+    same_top = float(np.mean(ref.argmax(1) == got.argmax(1)))
+    print(f"[mlp] parity: max |diff| {max_diff:.2e}, argmax agreement {same_top:.4f}")
+    if max_diff > 1e-4 or same_top < 1.0:
+        sys.exit("[mlp] parity check FAILED, not writing export")
+    np_clf.save(path)
+    print(f"[mlp] Wrote {len(np_clf.layers)} layers, {len(np_clf.classes)} classes to {path}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["export"]:
+        sys.exit("usage: python -m backend.tasks.mlp_runtime export")
+    export()
@@ -0,0 +1,120 @@
+# backend/tasks/model_registry.py
+
+import os
+import time
+import resource
+import threading
+
+
+def _rss_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Artifact:
+    def __init__(self, name, loader):
+        self.name         = name
+        self.loader       = loader
+        self.value        = None
+        self.state        = "cold"   # cold -> loading -> ready | failed
+        self.error        = None
+        self.load_seconds = None
+        self.rss_delta    = None
+        self.lock         = threading.Lock()
+
+    def info(self):
+        return {
+            "state": self.state,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "rss_delta_mb": round(self.rss_delta / (1024 * 1024), 1) if self.rss_delta is not None else None,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """
+    Models and data files loaded on first use instead of at import time.
+
+    Each artifact is registered with a zero-argument loader; `get` loads it
+    once (thread-safe) and caches it. `warm_up` loads artifacts eagerly, and
+    `status` reports per-artifact load time, RSS growth and readiness for the
+    health endpoints.
+    """
+
+    def __init__(self):
+        self._artifacts = {}
+
+    def register(self, name, loader):
+        self._artifacts[name] = _Artifact(name, loader)
+
+    def get(self, name):
+        art = self._artifacts[name]
+        if art.state == "ready":
+            return art.value
+        with art.lock:
+            if art.state != "ready":
+                self._load(art)
+        return art.value
+
+    def _load(self, art):
+        art.state, art.error = "loading", None
+        rss0, t0 = _rss_bytes(), time.perf_counter()
+        try:
+            art.value = art.loader()
+        except Exception as e:
+            art.state, art.error = "failed", f"{type(e).__name__}: {e}"
+            print(f"[registry] Failed to load {art.name}: {art.error}")
+            raise
+        art.load_seconds = time.perf_counter() - t0
+        art.rss_delta    = _rss_bytes() - rss0
+        art.state        = "ready"
+        print(f"[registry] Loaded {art.name} in {art.load_seconds:.2f}s "
+              f"(+{art.rss_delta / (1024 * 1024):.0f} MB RSS)")
+
+    def warm_up(self, names=None):
+        """Load the given artifacts (all by default); failures are recorded, not raised."""
+        for name in self._select(names):
+            try:
+                self.get(name)
+            except Exception:
+                pass
+        return self.status(names)
+
+    def names(self):
+        return list(self._artifacts)
+
+    def _select(self, names):
+        return list(self._artifacts) if names is None else list(names)
+
+    def is_ready(self, names=None):
+        return all(self._artifacts[n].state == "ready" for n in self._select(names))
+
+    def status(self, names=None):
+        """Status of the given artifacts (all by default), e.g. those this process owns."""
+        artifacts = {n: self._artifacts[n].info() for n in self._select(names)}
+        overall = overall_state(a["state"] for a in artifacts.values())
+        return {
+            "state": overall,
+            "ready": overall == "ready",
+            "rss_mb": round(_rss_bytes() / (1024 * 1024), 1),
+            "artifacts": artifacts,
+        }
+
+
+def overall_state(states):
+    """One state for a set of artifact states: failed, ready, warming or cold."""
+    states = set(states)
+    if "failed" in states:
+        return "failed"
+    if states <= {"ready"}:
+        return "ready"
+    if "loading" in states or "ready" in states:
+        return "warming"
+    return "cold"
+
+
+registry = ModelRegistry()
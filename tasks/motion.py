@@ -0,0 +1,88 @@
+# backend/tasks/motion.py
+
+import os
+import threading
+from collections import Counter
+
+import cv2
+import numpy as np
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# a pixel of the downscaled grey frame "moved" if it changed by more than
+# MOTION_PIXEL_DELTA; a frame has motion if at least MOTION_MIN_AREA of its
+# pixels moved
+MOTION_PIXEL_DELTA   = int(os.getenv("MOTION_PIXEL_DELTA", "25"))
+MOTION_MIN_AREA      = float(os.getenv("MOTION_MIN_AREA", "0.01"))
+# live cameras run detection at least this often even without motion (seconds)
+MOTION_FORCE_SECONDS = float(os.getenv("MOTION_FORCE_SECONDS", "5"))
+
+MOTION_SIZE = (96, 72)
+
+
+def downscale(img):
+    """Small blurred grey copy of a BGR frame; differencing these is noise-tolerant and cheap."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, MOTION_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (5, 5), 0)
+
+def motion_area(a, b, pixel_delta=MOTION_PIXEL_DELTA):
+    """Fraction of pixels that changed between two downscaled frames."""
+    return float(np.count_nonzero(cv2.absdiff(a, b) > pixel_delta)) / a.size
+
+
+# all live gates of this worker, for GET /health/inference
+_totals_lock = threading.Lock()
+_totals      = Counter()
+
+def motion_stats():
+    with _totals_lock:
+        seen = _totals["frames"]
+        return {
+            "frames": seen,
+            "detected": _totals["detected"],
+            "forced": _totals["forced"],
+            "skipped": _totals["skipped"],
+            "skip_rate": round(_totals["skipped"] / seen, 3) if seen else 0.0,
+        }
+
+
+class MotionGate:
+    """
+    Per-camera motion detector deciding whether a frame is worth running
+    detection on.
+
+    Each frame is compared with the last frame detection ran on, so slow
+    drift adds up until it counts as motion. Without motion the frame is
+    skipped, except that detection is forced every `force_seconds` so a
+    person standing still is still seen.
+    """
+
+    def __init__(self, min_area=MOTION_MIN_AREA, pixel_delta=MOTION_PIXEL_DELTA,
+                 force_seconds=MOTION_FORCE_SECONDS):
+        self.min_area      = min_area
+        self.pixel_delta   = pixel_delta
+        self.force_seconds = force_seconds
+        self._reference    = None
+        self._last_detect  = None
+        self.counts        = Counter()
+
+    def _count(self, *keys):
+        for key in keys:
+            self.counts[key] += 1
+        with _totals_lock:
+            for key in keys:
+                _totals[key] += 1
+
+    def should_detect(self, img, now):
+        small = downscale(img)
+        if self._reference is None or self._reference.shape != small.shape:
+            moved = True
+        else:
+            moved = motion_area(self._reference, small, self.pixel_delta) >= self.min_area
+        forced = not moved and now - self._last_detect >= self.force_seconds
+        if moved or forced:
+            self._reference, self._last_detect = small, now
+            self._count("frames", "detected", *(["forced"] if forced else []))
+            return True
+        self._count("frames", "skipped")
+        return False
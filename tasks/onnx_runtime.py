@@ -0,0 +1,255 @@
+# backend/tasks/onnx_runtime.py
+#
+# YOLO and Facenet on ONNX Runtime, without torch or TensorFlow at serving time.
+#
+#   python -m backend.tasks.onnx_runtime export-yolo      # needs torch + YOLO-FaceV2
+#   python -m backend.tasks.onnx_runtime export-facenet   # needs tensorflow + tf2onnx
+#   python -m backend.tasks.onnx_runtime quantize         # optional int8 copies
+#   python -m backend.tasks.onnx_runtime parity [IMAGE ...]
+#
+# Then serve with DETECT_BACKEND=onnx and/or EMBED_BACKEND=onnx (ONNX_INT8=1
+# for the quantized models). The parity check compares both against the
+# current torch/TF outputs and fails if the fp32 exports drift.
+
+import os
+import sys
+import numpy as np
+
+from backend.tasks.embedding import FacenetEngine, FACE_SIZE
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+YOLO_ONNX_PATH    = os.getenv("YOLO_ONNX_PATH", "/home/ayombalima/YOLO-FaceV2-master/yolov5s_v2.onnx")
+FACENET_ONNX_PATH = os.getenv("FACENET_ONNX_PATH", "/home/ayombalima/ml_models/facenet128.onnx")
+# intra-op threads per session (0 = one per physical core, ORT's default)
+ORT_THREADS       = int(os.getenv("ORT_THREADS", "0"))
+# use the dynamically int8-quantized models where they have been written
+ONNX_INT8         = os.getenv("ONNX_INT8", "0") == "1"
+
+
+def int8_path(path):
+    return os.path.splitext(path)[0] + ".int8.onnx"
+
+def resolve(path, int8=ONNX_INT8):
+    """The int8 variant of `path` if requested and exported, else `path`."""
+    if int8 and os.path.exists(int8_path(path)):
+        return int8_path(path)
+    return path
+
+def session(path, threads=ORT_THREADS):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opts.intra_op_num_threads = threads
+    # callers batch their work, so there is no parallelism between graph nodes to exploit
+    opts.inter_op_num_threads = 1
+    print(f"[onnx] Loading {path} ({threads or 'default'} threads)")
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+# ─── YOLO POST-PROCESSING (NumPy ports of yolov5's utils.general) ─────────
+def xywh2xyxy(x):
+    y = np.empty_like(x)
+    y[:, 0] = x[:, 0] - x[:, 2] / 2
+    y[:, 1] = x[:, 1] - x[:, 3] / 2
+    y[:, 2] = x[:, 0] + x[:, 2] / 2
+    y[:, 3] = x[:, 1] + x[:, 3] / 2
+    return y
+
+def nms(boxes, scores, iou_thres):
+    """Greedy NMS over (N, 4) xyxy boxes; indices kept, highest score first."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.asarray(keep, dtype=np.int64)
+
+def non_max_suppression(pred, conf_thres=0.25, iou_thres=0.45, max_det=300):
+    """
+    (B, anchors, 5 + classes) raw YOLO output -> per image an (N, 6) array
+    of x1, y1, x2, y2, conf, class, as yolov5's non_max_suppression returns
+    (best class per box; faces are a single class anyway).
+    """
+    out = []
+    for x in pred:
+        x = x[x[:, 4] > conf_thres]
+        if not len(x):
+            out.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+        cls_conf = x[:, 5:] * x[:, 4:5]
+        cls = cls_conf.argmax(axis=1)
+        conf = cls_conf[np.arange(len(x)), cls]
+        boxes = xywh2xyxy(x[:, :4])
+        mask = conf > conf_thres
+        boxes, conf, cls = boxes[mask], conf[mask], cls[mask]
+        # offset boxes per class so classes never suppress each other
+        keep = nms(boxes + cls[:, None] * 4096.0, conf, iou_thres)[:max_det]
+        out.append(np.concatenate([boxes[keep], conf[keep, None], cls[keep, None]], axis=1).astype(np.float32))
+    return out
+
+def scale_coords(img1_shape, coords, img0_shape):
+    """Boxes from the letterboxed img1_shape back to the original img0_shape, clipped."""
+    gain = min(img1_shape[0] / img0_shape[0], img1_shape[1] / img0_shape[1])
+    pad_x = (img1_shape[1] - img0_shape[1] * gain) / 2
+    pad_y = (img1_shape[0] - img0_shape[0] * gain) / 2
+    coords = coords.copy()
+    coords[:, [0, 2]] = (coords[:, [0, 2]] - pad_x) / gain
+    coords[:, [1, 3]] = (coords[:, [1, 3]] - pad_y) / gain
+    coords[:, [0, 2]] = coords[:, [0, 2]].clip(0, img0_shape[1])
+    coords[:, [1, 3]] = coords[:, [1, 3]].clip(0, img0_shape[0])
+    return coords
+
+
+# ─── RUNTIMES ─────────────────────────────────────────────────────────────
+class OnnxYolo:
+    """YOLO-FaceV2 exported to ONNX; same `detect` as match_faces.TorchYolo, with NumPy NMS."""
+
+    def __init__(self, path=None):
+        self.session = session(path or resolve(YOLO_ONNX_PATH))
+        self.input   = self.session.get_inputs()[0].name
+
+    def forward(self, batch):
+        """(B, H, W, 3) BGR uint8 letterboxed frames -> raw (B, anchors, 5 + classes) output."""
+        x = np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return self.session.run(None, {self.input: x})[0]
+
+    def detect(self, batch, shapes, conf_thres=0.25, iou_thres=0.45):
+        """One (N, 5) x1, y1, x2, y2, conf array per frame, in the pixels of `shapes`."""
+        out = []
+        for dets, shape in zip(non_max_suppression(self.forward(batch), conf_thres, iou_thres), shapes):
+            dets[:, :4] = scale_coords(batch.shape[1:3], dets[:, :4], shape).round()
+            out.append(dets[:, :5])
+        return out
+
+
+class OnnxFacenetEngine(FacenetEngine):
+    """FacenetEngine API (same normalization and outputs) on ONNX Runtime."""
+
+    def __init__(self, path=None):
+        self.session = session(path or resolve(FACENET_ONNX_PATH))
+        self.input   = self.session.get_inputs()[0].name
+
+    def embed(self, faces):
+        return np.asarray(self.session.run(None, {self.input: self.normalize(faces)})[0], dtype=np.float32)
+
+
+# ─── EXPORT ───────────────────────────────────────────────────────────────
+def export_yolo(path=YOLO_ONNX_PATH, opset=12):
+    import torch
+    from backend.tasks.match_faces import TorchYolo, DETECT_SIZE
+    yolo = TorchYolo()
+    model = yolo.model
+    dummy = torch.zeros(1, 3, DETECT_SIZE, DETECT_SIZE, device=yolo.device)
+    model(dummy)  # builds the Detect grids
+    # the first output is the decoded (batch, anchors, 5 + classes) tensor detect_boxes uses
+    torch.onnx.export(
+        model, dummy, path, opset_version=opset,
+        input_names=["images"], output_names=["output"],
+        dynamic_axes={"images": {0: "batch"}, "output": {0: "batch"}},
+    )
+    print(f"[onnx] Wrote {path}")
+
+def export_facenet(path=FACENET_ONNX_PATH, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+    from backend.tasks.embedding import load_facenet_model
+    model = load_facenet_model()
+    spec = [tf.TensorSpec((None, *FACE_SIZE, 3), tf.float32, name="input")]
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=path)
+    print(f"[onnx] Wrote {path}")
+
+def quantize(paths=(YOLO_ONNX_PATH, FACENET_ONNX_PATH)):
+    """Dynamic int8 quantization of the weights; activations stay float."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    for path in paths:
+        quantize_dynamic(path, int8_path(path), weight_type=QuantType.QInt8)
+        mb = lambda p: os.path.getsize(p) / (1024 * 1024)
+        print(f"[onnx] Wrote {int8_path(path)} ({mb(path):.1f} MB -> {mb(int8_path(path)):.1f} MB)")
+
+
+# ─── PARITY ───────────────────────────────────────────────────────────────
+def _cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+def facenet_parity(ref_engine, engine, n=32, seed=0):
+    """Lowest cosine similarity between reference and ONNX embeddings of random faces."""
+    faces = np.random.default_rng(seed).integers(0, 256, size=(n, *FACE_SIZE, 3), dtype=np.uint8)
+    return float(_cosine(ref_engine.embed(faces), engine.embed(faces)).min())
+
+def yolo_parity(ref_detect, onnx_detect, frames):
+    """
+    Compare detections frame by frame: (worst matched-box IoU, number of
+    frames whose box count differs).
+    """
+    from backend.tasks.tracker import iou_matrix
+    worst, count_mismatch = 1.0, 0
+    for ref, got in zip(ref_detect(frames), onnx_detect(frames)):
+        if len(ref) != len(got):
+            count_mismatch += 1
+        if len(ref) and len(got):
+            worst = min(worst, float(iou_matrix(ref[:, :4], got[:, :4]).max(axis=1).min()))
+    return worst, count_mismatch
+
+def parity(image_paths=()):
+    import cv2
+    from backend.tasks.embedding import load_facenet_model
+    from backend.tasks.match_faces import detect_boxes_batch, letterbox, DETECT_BATCH_SIZE, DETECT_BACKEND
+    if DETECT_BACKEND != "torch":
+        sys.exit("[onnx] run the parity check with DETECT_BACKEND=torch, it is the reference")
+
+    failed = False
+    ref_engine = FacenetEngine(load_facenet_model())
+    for int8 in (False, True):
+        path = int8_path(FACENET_ONNX_PATH) if int8 else FACENET_ONNX_PATH
+        if not os.path.exists(path):
+            continue
+        cos = facenet_parity(ref_engine, OnnxFacenetEngine(path))
+        ok = cos >= (0.98 if int8 else 0.9999)
+        failed |= not ok and not int8
+        print(f"[onnx] facenet {os.path.basename(path)}: min cosine vs TF {cos:.5f} {'ok' if ok else 'MISMATCH'}")
+
+    frames = [cv2.imread(p) for p in image_paths]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        print("[onnx] no images given, skipping the YOLO comparison")
+    for int8 in (False, True):
+        path = int8_path(YOLO_ONNX_PATH) if int8 else YOLO_ONNX_PATH
+        if not frames or not os.path.exists(path):
+            continue
+        yolo = OnnxYolo(path)
+        def onnx_detect(imgs):
+            out = []
+            for start in range(0, len(imgs), DETECT_BATCH_SIZE):
+                chunk = imgs[start:start + DETECT_BATCH_SIZE]
+                out += yolo.detect(np.stack([letterbox(f) for f in chunk]), [f.shape for f in chunk])
+            return out
+        worst_iou, mismatched = yolo_parity(detect_boxes_batch, onnx_detect, frames)
+        ok = mismatched == 0 and worst_iou >= (0.9 if int8 else 0.99)
+        failed |= not ok and not int8
+        print(f"[onnx] yolo {os.path.basename(path)}: worst box IoU vs torch {worst_iou:.4f}, "
+              f"{mismatched}/{len(frames)} frames with a different face count {'ok' if ok else 'MISMATCH'}")
+
+    if failed:
+        sys.exit("[onnx] parity check FAILED")
+
+
+if __name__ == "__main__":
+    commands = {
+        "export-yolo": lambda args: export_yolo(),
+        "export-facenet": lambda args: export_facenet(),
+        "quantize": lambda args: quantize(),
+        "parity": parity,
+    }
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        sys.exit("usage: python -m backend.tasks.onnx_runtime {export-yolo|export-facenet|quantize|parity [IMAGE ...]}")
+    commands[sys.argv[1]](sys.argv[2:])
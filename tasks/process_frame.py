@@ -1,85 +1,143 @@
 # backend/tasks/process_frame.py
 
-import cv2
-import json
+import time
+import asyncio
 import numpy as np
-from deepface import DeepFace
 
 from backend.alerts_utils import push_alert_to_db
 from backend.ws_broadcast import broadcast_event
+from backend.tasks.embedding import embed_faces
+from backend.tasks.model_registry import registry
+from backend.tasks.live_batcher import MicroBatcher
+from backend.tasks.inference_executor import inference
+from backend.tasks.tracker import IdentityCache
+from backend.tasks.face_quality import gate
 
 from backend.tasks.match_faces import (
-    detect_faces,
+    detect_faces_batch,
     COSINE_SIMILARITY_THRESHOLD,
     ML_CONFIDENCE_THRESHOLD,
-    scaler,
-    ml_model,
-    label_encoder,
-    EMBEDDING_JSON,
+    DEDUP_WINDOW,
 )
 
-# Load known embeddings once
-with open(EMBEDDING_JSON, "r") as f:
-    known_embeddings = json.load(f)
+def _ml_event(sid, score):
+    print(f"[process_frame:ML] sid={sid}, score={score:.2f}")
+    student = f"Student #{sid}" if score >= ML_CONFIDENCE_THRESHOLD else "Unknown"
+    evt_type = "success" if score >= ML_CONFIDENCE_THRESHOLD else "warning"
+    return {
+        "type": evt_type,
+        "student": student,
+        "location": "Ashesi Main Campus Entrance",
+        "confidence": round(score, 2),
+    }
 
-async def process_frame(img: np.ndarray, mode: str):
+def _cosine_event(best_id, best_score):
+    print(f"[process_frame:Cosine] best_id={best_id}, best_score={best_score:.2f}")
+    student = f"Student #{best_id}" if best_id else "Unknown"
+    evt_type = "success" if best_id else "warning"
+    return {
+        "type": evt_type,
+        "student": student,
+        "location": "Ashesi Main Campus Entrance",
+        "score": round(best_score, 2) if best_id else None,
+    }
+
+def identify_frames(frames):
     """
-    Process one BGR frame, run either cosine‐similarity or ML pipeline,
-    and return an event dict.
+    Blocking part of process_frame for a batch of (img, mode, cache)
+    frames, which may come from different cameras: one batched detection
+    and one batched embedding for every face in all of them that passes
+    the quality gate (tasks/face_quality.py). Faces their camera's
+    IdentityCache recognized recently are not embedded again.
+
+    Returns, per frame, a list of event dicts (not yet stored), one per
+    face, largest face first.
     """
-    faces = detect_faces(img)
-    if not faces:
-        print("[process_frame] no face detected")
-        return {"type": "warning", "message": "no face", "location": None}
-
-    face_crop, bbox = faces[0]
-    print(f"[process_frame] detected face bbox={bbox}")
-
-    rgb = cv2.cvtColor(cv2.resize(face_crop, (160, 160)), cv2.COLOR_BGR2RGB)
-    emb = DeepFace.represent(
-        rgb, model_name="Facenet", enforce_detection=False
-    )[0]["embedding"]
-    print(f"[process_frame] computed embedding[0:5]={emb[:5]}")
-
-    # Choose pipeline
-    if mode == "ml":
-        emb_s = scaler.transform([emb])
-        probs = ml_model.predict(emb_s, verbose=0)[0]
-        cid = int(np.argmax(probs))
-        sid = label_encoder.inverse_transform([cid])[0]
-        score = float(probs[cid])
-        print(f"[process_frame:ML] sid={sid}, score={score:.2f}")
-
-        student = f"Student #{sid}" if score >= ML_CONFIDENCE_THRESHOLD else "Unknown"
-        evt_type = "success" if score >= ML_CONFIDENCE_THRESHOLD else "warning"
-        evt = {
-            "type": evt_type,
-            "student": student,
-            "location": "Ashesi Main Campus Entrance",
-            "confidence": round(score, 2),
-        }
-    else:
-        best_id, best_score = None, -1.0
-        for sid, embs in known_embeddings.items():
-            sim = np.mean([
-                np.dot(emb, e) / (np.linalg.norm(emb) * np.linalg.norm(e))
-                for e in embs
-            ])
-            if sim >= COSINE_SIMILARITY_THRESHOLD and sim > best_score:
-                best_id, best_score = sid, sim
-        print(f"[process_frame:Cosine] best_id={best_id}, best_score={best_score:.2f}")
-
-        student = f"Student #{best_id}" if best_id else "Unknown"
-        evt_type = "success" if best_id else "warning"
-        evt = {
-            "type": evt_type,
-            "student": student,
-            "location": "Ashesi Main Campus Entrance",
-            "score": round(best_score, 2) if best_id else None,
-        }
-
-    # Persist & broadcast
-    evt = push_alert_to_db(evt)
-    print(f"[process_frame] broadcasting event id={evt.get('id')}: {evt}")
-    await broadcast_event(evt)
-    return evt
+    now = time.monotonic()
+    all_faces = detect_faces_batch([img for img, _, _ in frames])
+    events = [[] for _ in frames]
+    # (frame index, crop, live track, event to fill in) for faces that need embedding
+    todo = []
+    for i, frame_faces in enumerate(all_faces):
+        # faces failing the quality gate are left for a later, better frame
+        usable = [(crop, bbox) for crop, bbox, conf in frame_faces if gate.check(crop, conf) is None]
+        usable.sort(key=lambda f: -f[0].shape[0] * f[0].shape[1])
+        cache = frames[i][2]
+        tracks = cache.assign([bbox for _, bbox in usable], now) if cache else [None] * len(usable)
+        for (crop, bbox), track in zip(usable, tracks):
+            evt = cache.cached_identity(track, now) if cache else None
+            if evt is None:
+                evt = {}
+                todo.append((i, crop, track, evt))
+            else:
+                evt["cached"] = True
+            evt["bbox"] = [int(v) for v in bbox]
+            if track is not None:
+                evt["track"] = track.id
+            events[i].append(evt)
+    if not todo:
+        if not any(events):
+            print(f"[process_frame] no face detected in {len(frames)} frame(s)")
+        return events
+
+    embs = embed_faces([crop for _, crop, _, _ in todo])
+
+    # Choose pipeline, per frame
+    ml = [k for k, (i, _, _, _) in enumerate(todo) if frames[i][1] == "ml"]
+    if ml:
+        classifier = registry.get("classifier")
+        probs = classifier.predict_proba(embs[ml])
+        for row, k in enumerate(ml):
+            cid = int(np.argmax(probs[row]))
+            todo[k][3].update(_ml_event(classifier.classes[cid], float(probs[row, cid])))
+    cosine = [k for k, (i, _, _, _) in enumerate(todo) if frames[i][1] != "ml"]
+    if cosine:
+        # known embeddings are packed once per process, on first use
+        matcher = registry.get("matcher")
+        matches = matcher.best_matches(embs[cosine], COSINE_SIMILARITY_THRESHOLD)
+        for k, match in zip(cosine, matches):
+            todo[k][3].update(_cosine_event(*match))
+
+    for i, _, track, evt in todo:
+        if track is not None:
+            frames[i][2].remember(track, evt, now)
+    return events
+
+
+_batcher = None
+
+def live_batcher():
+    """The frame scheduler shared by every live connection of this worker."""
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher(identify_frames, run=inference.run, max_inflight=inference.workers)
+    return _batcher
+
+def _store_events(events):
+    return [push_alert_to_db(evt) for evt in events]
+
+async def process_frame(img: np.ndarray, mode: str, cache=None):
+    """
+    Identify every face in one BGR frame and return the largest face's event
+    plus all of them in "faces"; only alerts `cache` lets through are stored.
+    """
+    events = await live_batcher().submit((img, mode, cache))
+    if not events:
+        return {"type": "warning", "message": "no face", "location": None, "faces": []}
+
+    now = time.monotonic()
+    for evt in events:
+        evt["alert"] = cache is None or cache.should_alert(evt, now)
+    alerts = [evt for evt in events if evt["alert"]]
+
+    # Persist & broadcast; push_alert_to_db adds id and time to the dicts in place
+    if alerts:
+        await asyncio.to_thread(_store_events, alerts)
+    for evt in alerts:
+        print(f"[process_frame] broadcasting event id={evt.get('id')}: {evt}")
+        await broadcast_event(evt)
+    return {**events[0], "faces": events}
+
+def new_identity_cache():
+    """A fresh per-camera cache for process_frame."""
+    return IdentityCache(window=DEDUP_WINDOW)
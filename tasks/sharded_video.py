@@ -0,0 +1,150 @@
+# backend/tasks/sharded_video.py
+
+import os
+import math
+import time
+import threading
+import cv2
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from backend.tasks.video_frames import SAMPLE_EVERY_N, SAMPLE_FPS, SAMPLE_ADAPTIVE, SAMPLE_BUDGET, frame_count
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+# worker processes for decode + detection of long videos (0 = sequential)
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_SECONDS = float(os.getenv("SHARD_SECONDS", "120"))
+# how often (seconds) the parent reports progress while shards run
+SHARD_POLL    = 0.5
+
+
+def plan_shards(video_path, shard_seconds=SHARD_SECONDS, every_n=SAMPLE_EVERY_N, per_second=SAMPLE_FPS):
+    """
+    Split a video into [start_frame, end_frame) ranges of about
+    `shard_seconds` each. Boundaries fall on sample positions, and
+    sample_frames keeps every shard on the same ceil(k * step) grid, so the
+    shards sample exactly the frames a single sequential pass would, for
+    fractional steps too.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    fps      = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    step = max(fps / per_second if per_second else every_n, 1)
+    samples_per_shard = max(1, round(shard_seconds * fps / step))
+    bounds = []
+    k = 0
+    while True:
+        start = math.ceil(k * samples_per_shard * step)
+        if n_frames <= 0 or start >= n_frames:
+            break
+        bounds.append(start)
+        k += 1
+    if not bounds:
+        return [(0, None)]
+    # frame counts from the container can be off, so the last shard reads to EOF
+    return [(s, e) for s, e in zip(bounds, bounds[1:])] + [(bounds[-1], None)]
+
+def _detect_shard(video_path, start_frame, end_frame, every_n, per_second, adaptive=False, budget=SAMPLE_BUDGET,
+                  dump_dirs=None):
+    """
+    Worker: decode and detect one shard, return [(frame_id, faces), ...].
+    With `adaptive` the shard is sampled adaptively, within `budget` frames.
+    """
+    from backend.tasks.match_faces import detect_faces_batch, DETECT_BATCH_SIZE
+    from backend.tasks.video_frames import iter_frames, iter_detections, AdaptiveSampler
+    t0 = time.perf_counter()
+    sampler = (AdaptiveSampler.for_video(video_path, start_frame, end_frame, budget, every_n=every_n,
+                                         per_second=per_second) if adaptive else None)
+    frames = iter_frames(video_path, every_n, per_second, dump_dirs=dump_dirs, start_frame=start_frame,
+                         end_frame=end_frame, sampler=sampler)
+    out = [
+        (fid, faces)
+        for fid, _, faces in iter_detections(frames, detect_faces_batch, DETECT_BATCH_SIZE, sampler)
+    ]
+    print(f"[shard] frames {start_frame}-{end_frame if end_frame is not None else 'end'}: "
+          f"{len(out)} sampled in {time.perf_counter() - t0:.1f}s (pid {os.getpid()})")
+    return out
+
+def _shard_budgets(shards, n_frames, budget):
+    """SAMPLE_BUDGET split over the shards in proportion to their length (0: each derives its own)."""
+    if not n_frames or not budget:
+        return [budget] * len(shards)
+    ends = [e if e is not None else n_frames for _, e in shards]
+    return [max(1, math.ceil(budget * (e - s) / n_frames)) for (s, _), e in zip(shards, ends)]
+
+_pool      = None
+_pool_lock = threading.Lock()
+
+def shard_pool(workers=SHARD_WORKERS):
+    """
+    The worker processes shared by all jobs of this API worker. They live
+    as long as it does, so each loads its models once, and SHARD_WORKERS
+    bounds them however many jobs run at once.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the parent may already hold torch/TF state that must not be forked
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        return _pool
+
+def shutdown_shard_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def sharded_detections(video_path, workers=SHARD_WORKERS, shard_seconds=SHARD_SECONDS,
+                       every_n=SAMPLE_EVERY_N, per_second=SAMPLE_FPS, adaptive=SAMPLE_ADAPTIVE,
+                       progress=None, dump_dirs=None):
+    """
+    Decode and detect a video in parallel time shards on the shard pool.
+
+    Returns [(frame_id, faces), ...] for the whole video in frame order, so
+    tracks are then built over one continuous stream and tracks crossing a
+    shard boundary join exactly as in a sequential pass. With `adaptive`
+    each shard runs its own AdaptiveSampler on its share of the budget.
+
+    `progress(fraction_of_shards_done)` is called while the shards run; if
+    it raises (a cancelled job), this job's shards not yet started are
+    dropped and the exception propagates.
+    """
+    shards = plan_shards(video_path, shard_seconds, every_n, per_second)
+    budgets = _shard_budgets(shards, frame_count(video_path), SAMPLE_BUDGET)
+    if len(shards) == 1 or workers <= 1:
+        if progress is not None:
+            progress(0.0)
+        return _detect_shard(video_path, 0, None, every_n, per_second, adaptive, dump_dirs=dump_dirs)
+    print(f"[shard] {len(shards)} shards of ~{shard_seconds:.0f}s on {workers} shared workers")
+    pool = shard_pool(workers)
+    futures = []
+    try:
+        futures = [pool.submit(_detect_shard, video_path, s, e, every_n, per_second, adaptive, b, dump_dirs)
+                   for (s, e), b in zip(shards, budgets)]
+        pending = set(futures)
+        while pending:
+            if progress is not None:
+                progress(1 - len(pending) / len(futures))
+            _, pending = wait(pending, timeout=SHARD_POLL, return_when=FIRST_COMPLETED)
+        return [det for f in futures for det in f.result()]
+    except BrokenProcessPool:
+        # a worker died (e.g. out of memory); the next job gets a fresh pool
+        _discard_pool(pool)
+        raise
+    except BaseException:
+        for f in futures:
+            f.cancel()
+        raise
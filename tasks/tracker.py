@@ -0,0 +1,227 @@
+# backend/tasks/tracker.py
+
+import os
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is optional, greedy matching is used without it
+    linear_sum_assignment = None
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+# a track survives this many sampled frames without a matching detection
+TRACK_MAX_AGE       = int(os.getenv("TRACK_MAX_AGE", "2"))
+TRACK_MATCHING      = os.getenv("TRACK_MATCHING", "hungarian")  # or "greedy"
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) x1, y1, x2, y2 boxes -> (N, M)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter  = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union  = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+def greedy_match(iou, threshold):
+    """Highest-IoU pairs first, each row/column used at most once."""
+    pairs = []
+    if not iou.size:
+        return pairs
+    rows, cols = np.unravel_index(np.argsort(-iou, axis=None), iou.shape)
+    used_r, used_c = set(), set()
+    for r, c in zip(rows, cols):
+        if iou[r, c] < threshold:
+            break
+        if r not in used_r and c not in used_c:
+            used_r.add(r)
+            used_c.add(c)
+            pairs.append((int(r), int(c)))
+    return pairs
+
+def hungarian_match(iou, threshold):
+    """Optimal assignment maximizing total IoU, pairs below threshold dropped."""
+    if linear_sum_assignment is None:
+        return greedy_match(iou, threshold)
+    if not iou.size:
+        return []
+    rows, cols = linear_sum_assignment(-iou)
+    return [(int(r), int(c)) for r, c in zip(rows, cols) if iou[r, c] >= threshold]
+
+def crop_area(crop, bbox, conf=None):
+    return float(crop.shape[0] * crop.shape[1])
+
+
+class Track:
+    def __init__(self, track_id, frame_id, face, quality):
+        self.id           = track_id
+        self.bbox         = face[1]
+        self.first_frame  = frame_id
+        self.last_frame   = frame_id
+        self.hits         = 1
+        self.misses       = 0
+        self._keep(face, quality)
+
+    def _keep(self, face, quality):
+        self.best_crop, self.best_bbox = face[0], face[1]
+        self.best_conf    = face[2] if len(face) > 2 else None
+        self.best_quality = quality
+
+    def update(self, frame_id, face, quality):
+        self.bbox       = face[1]
+        self.last_frame = frame_id
+        self.hits      += 1
+        self.misses     = 0
+        if quality > self.best_quality:
+            self._keep(face, quality)
+
+
+class FaceTracker:
+    """
+    Multi-object face tracker over sampled frames.
+
+    Each frame's detections are associated to live tracks through one
+    vectorized IoU matrix and Hungarian (or greedy) matching. Matched tracks
+    move to the new box and keep the best-quality crop seen so far;
+    unmatched detections start new tracks; tracks unmatched for more than
+    `max_age` frames are retired.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE,
+                 matching=TRACK_MATCHING, quality=crop_area):
+        self.iou_threshold = iou_threshold
+        self.max_age  = max_age
+        self.match    = hungarian_match if matching == "hungarian" else greedy_match
+        self.quality  = quality
+        self.active   = []
+        self.finished = []
+        self._next_id = 0
+
+    def update(self, frame_id, faces):
+        """
+        Feed one frame's [(crop, bbox[, conf]), ...]; returns the tracks
+        touched by it. `quality` is called with the same fields.
+        """
+        boxes = [face[1] for face in faces]
+        pairs = self.match(iou_matrix([t.bbox for t in self.active], boxes), self.iou_threshold)
+        matched_t = {t for t, _ in pairs}
+        matched_d = {d for _, d in pairs}
+
+        touched = []
+        for t, d in pairs:
+            self.active[t].update(frame_id, faces[d], self.quality(*faces[d]))
+            touched.append(self.active[t])
+
+        still_active = []
+        for i, track in enumerate(self.active):
+            if i not in matched_t:
+                track.misses += 1
+            (self.finished if track.misses > self.max_age else still_active).append(track)
+        self.active = still_active
+
+        for d, face in enumerate(faces):
+            if d not in matched_d:
+                track = Track(self._next_id, frame_id, face, self.quality(*face))
+                self._next_id += 1
+                self.active.append(track)
+                touched.append(track)
+        return touched
+
+    def tracks(self):
+        """All tracks seen so far, retired and live, in order of first appearance."""
+        return sorted(self.finished + self.active, key=lambda t: t.id)
+
+
+def track_faces(detections, **kwargs):
+    """Run a FaceTracker over [(frame_id, faces), ...] and return its tracks."""
+    tracker = FaceTracker(**kwargs)
+    for frame_id, faces in detections:
+        tracker.update(frame_id, faces)
+    return tracker.tracks()
+
+
+# ─── LIVE IDENTITY CACHE ──────────────────────────────────────────────────
+# a live track is forgotten after this many seconds without a detection
+LIVE_TRACK_GAP = float(os.getenv("LIVE_TRACK_GAP", "2.0"))
+
+
+class LiveTrack:
+    def __init__(self, track_id, bbox, now):
+        self.id            = track_id
+        self.bbox          = bbox
+        self.last_seen     = now
+        self.identity      = None   # last recognized event dict, reused while fresh
+        self.identified_at = None
+
+
+class IdentityCache:
+    """
+    Short-term memory of one live camera, in wall-clock time.
+
+    `assign` matches a frame's boxes to recent tracks by IoU, so a face
+    that stays in view keeps its track. A recognized identity is reused
+    for `window` seconds instead of embedding the face again
+    (`cached_identity`), and `should_alert` lets through one alert per
+    student, or per unknown track, per `window` seconds.
+    """
+
+    def __init__(self, window, iou_threshold=TRACK_IOU_THRESHOLD, max_gap=LIVE_TRACK_GAP):
+        self.window        = window
+        self.iou_threshold = iou_threshold
+        self.max_gap       = max_gap
+        self.tracks        = []
+        self._alerted      = {}
+        self._next_id      = 0
+        self.hits          = 0
+        self.misses        = 0
+
+    def assign(self, bboxes, now):
+        """One LiveTrack per box, continuing recent tracks where they overlap."""
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_gap]
+        pairs = greedy_match(iou_matrix([t.bbox for t in self.tracks], bboxes), self.iou_threshold)
+        assigned = [None] * len(bboxes)
+        for t, d in pairs:
+            assigned[d] = self.tracks[t]
+        for d, bbox in enumerate(bboxes):
+            if assigned[d] is None:
+                assigned[d] = LiveTrack(self._next_id, bbox, now)
+                self._next_id += 1
+                self.tracks.append(assigned[d])
+            assigned[d].bbox, assigned[d].last_seen = bbox, now
+        return assigned
+
+    def touch(self, now):
+        """
+        The camera saw no change (motion-gated frame): everyone still in
+        view is where they were, so keep their tracks alive until `now`.
+        """
+        for t in self.tracks:
+            if now - t.last_seen <= self.max_gap:
+                t.last_seen = now
+
+    def cached_identity(self, track, now):
+        """The track's recognized event if still fresh, else None (embed it)."""
+        if track.identity is not None and now - track.identified_at < self.window:
+            self.hits += 1
+            return dict(track.identity)
+        self.misses += 1
+        return None
+
+    def remember(self, track, evt, now):
+        # only recognitions are reused; unknown faces are retried every frame
+        track.identity      = dict(evt) if evt.get("type") == "success" else None
+        track.identified_at = now
+
+    def should_alert(self, evt, now):
+        key = evt["student"] if evt.get("type") == "success" else f"unknown:{evt.get('track')}"
+        self._alerted = {k: t for k, t in self._alerted.items() if now - t < self.window}
+        if key in self._alerted:
+            return False
+        self._alerted[key] = now
+        return True
@@ -0,0 +1,98 @@
+# backend/tasks/tta.py
+
+import os
+import numpy as np
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+TTA_MIN_AUG           = int(os.getenv("TTA_MIN_AUG", "2"))
+TTA_MAX_AUG           = int(os.getenv("TTA_MAX_AUG", "5"))
+# winner must lead the runner-up by this many votes to stop early …
+TTA_VOTE_MARGIN       = int(os.getenv("TTA_VOTE_MARGIN", "2"))
+# … and its mean confidence must be this far from ML_CONFIDENCE_THRESHOLD
+TTA_CONFIDENCE_MARGIN = float(os.getenv("TTA_CONFIDENCE_MARGIN", "0.1"))
+
+
+def tta_vote(probs, n_aug):
+    """
+    Majority vote over test-time augmentations, for all tracks at once.
+
+    `probs` is the (n_tracks * n_aug, n_classes) classifier output with each
+    track's augmentations in consecutive rows. Returns per-track
+    (winning class id, mean confidence of the votes for that class,
+    vote lead of the winner over the runner-up).
+    Ties go to the class voted for first, like Counter.most_common.
+    """
+    n_classes = probs.shape[1]
+    cids  = probs.argmax(axis=1).reshape(-1, n_aug)
+    confs = probs.max(axis=1).reshape(-1, n_aug)
+    rows  = np.repeat(np.arange(len(cids)), n_aug)
+
+    counts = np.zeros((len(cids), n_classes), dtype=np.int64)
+    np.add.at(counts, (rows, cids.ravel()), 1)
+    first = np.full((len(cids), n_classes), n_aug, dtype=np.int64)
+    np.minimum.at(first, (rows, cids.ravel()), np.tile(np.arange(n_aug), len(cids)))
+
+    winners = np.argmax(counts * (n_aug + 1) - first, axis=1)
+    agree   = cids == winners[:, None]
+    avg_confidence = (confs * agree).sum(axis=1) / agree.sum(axis=1)
+    # zero column so a single-class vote still has a runner-up
+    padded = np.hstack([counts, np.zeros((len(counts), 1), dtype=np.int64)])
+    top2 = -np.partition(-padded, 1, axis=1)[:, :2]
+    return winners, avg_confidence, top2[:, 0] - top2[:, 1]
+
+
+class TTAPolicy:
+    """
+    Early-exit schedule for test-time augmentation.
+
+    Every track gets `min_aug` augmentations, then one more per round until
+    its vote is settled or it reaches `max_aug`. A vote is settled once the
+    winner leads by `vote_margin` votes and its mean confidence is at least
+    `confidence_margin` away from the accept threshold, on either side.
+    """
+
+    def __init__(self, min_aug=TTA_MIN_AUG, max_aug=TTA_MAX_AUG,
+                 vote_margin=TTA_VOTE_MARGIN, confidence_margin=TTA_CONFIDENCE_MARGIN):
+        if not 1 <= min_aug <= max_aug:
+            raise ValueError(f"need 1 <= min_aug <= max_aug, got {min_aug}, {max_aug}")
+        self.min_aug = min_aug
+        self.max_aug = max_aug
+        self.vote_margin = vote_margin
+        self.confidence_margin = confidence_margin
+
+    def settled(self, margin, confidence, threshold):
+        return margin >= self.vote_margin and abs(confidence - threshold) >= self.confidence_margin
+
+
+def adaptive_tta(crops, augment, classify, threshold, policy=None):
+    """
+    Vote over augmentations of each crop, stopping early per `policy`.
+
+    `augment(crop)` returns one augmented crop; `classify(images)` returns
+    the (n, n_classes) probabilities for a list of images in one batch, so
+    each round is a single batched call for all still-undecided tracks.
+    Returns (class ids, mean confidences, augmentations used) per crop.
+    """
+    policy = policy or TTAPolicy()
+    history = [[] for _ in crops]
+    active  = list(range(len(crops)))
+    step    = policy.min_aug
+    while active:
+        images = [augment(crops[t]) for t in active for _ in range(step)]
+        probs  = classify(images)
+        still_active = []
+        for i, t in enumerate(active):
+            history[t].append(probs[i * step:(i + 1) * step])
+            p = np.vstack(history[t])
+            _, conf, margin = tta_vote(p, len(p))
+            if len(p) < policy.max_aug and not policy.settled(margin[0], conf[0], threshold):
+                still_active.append(t)
+        active, step = still_active, 1
+
+    winners, confidences = np.zeros(len(crops), dtype=np.int64), np.zeros(len(crops))
+    used = np.zeros(len(crops), dtype=np.int64)
+    for t, rows in enumerate(history):
+        p = np.vstack(rows)
+        w, c, _ = tta_vote(p, len(p))
+        winners[t], confidences[t], used[t] = w[0], c[0], len(p)
+    return winners, confidences, used
@@ -0,0 +1,281 @@
+# backend/tasks/video_frames.py
+
+import os
+import math
+import time
+import shutil
+import tempfile
+import cv2
+from contextlib import contextmanager
+
+from backend.tasks.motion import downscale, motion_area, MOTION_MIN_AREA
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────
+FRAME_SIZE      = (640, 640)
+# write every sampled frame to disk as well, for debugging detections
+DUMP_FRAMES     = os.getenv("DUMP_FRAMES", "0") == "1"
+# dumping jobs get their own scratch dir under SCRATCH_ROOT, with the
+# frames in these subdirectories of it
+SCRATCH_ROOT    = os.getenv("SCRATCH_ROOT", tempfile.gettempdir())
+EXTRACTED_DIR   = "extracted_frames"
+RESIZED_DIR     = "resized_frames"
+# sample every N-th frame, or SAMPLE_FPS frames per second of video if set
+SAMPLE_EVERY_N  = int(os.getenv("SAMPLE_EVERY_N", "60"))
+SAMPLE_FPS      = float(os.getenv("SAMPLE_FPS", "0")) or None
+# seek instead of grabbing through gaps of at least this many frames (0 = never);
+# worth it for long gaps on codecs with frequent keyframes
+SAMPLE_SEEK_GAP = int(os.getenv("SAMPLE_SEEK_GAP", "0"))
+# opt-in adaptive sampling of uploads (SAMPLE_ADAPTIVE=1): probe every
+# SAMPLE_MIN_SECONDS, detect on every probe while something moves or faces
+# were just seen, back off exponentially up to SAMPLE_MAX_SECONDS on static
+# footage. Detection runs on at most SAMPLE_BUDGET frames per video; 0 (the
+# default) means as many as SAMPLE_EVERY_N/SAMPLE_FPS would sample, so it
+# never costs more than fixed sampling and those settings still set the cost.
+SAMPLE_ADAPTIVE    = os.getenv("SAMPLE_ADAPTIVE", "0") == "1"
+SAMPLE_MIN_SECONDS = float(os.getenv("SAMPLE_MIN_SECONDS", "0.25"))
+SAMPLE_MAX_SECONDS = float(os.getenv("SAMPLE_MAX_SECONDS", "3"))
+SAMPLE_BUDGET      = int(os.getenv("SAMPLE_BUDGET", "0"))
+
+
+class DecodeStats:
+    """Counters for one pass over a video; only decoder time is counted."""
+
+    def __init__(self):
+        self.grabbed = 0
+        self.sampled = 0
+        self.seeks   = 0
+        self.decode_seconds = 0.0
+
+    @property
+    def decode_fps(self):
+        return self.grabbed / self.decode_seconds if self.decode_seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "grabbed": self.grabbed,
+            "sampled": self.sampled,
+            "seeks": self.seeks,
+            "decode_seconds": round(self.decode_seconds, 3),
+            "decode_fps": round(self.decode_fps, 1),
+        }
+
+    def __str__(self):
+        return (f"sampled {self.sampled}, grabbed {self.grabbed}, {self.seeks} seeks, "
+                f"{self.decode_seconds:.2f}s decoding ({self.decode_fps:.0f} frames/s)")
+
+
+def frame_count(video_path):
+    """Frame count from the container header (an estimate for some codecs)."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0) if cap.isOpened() else 0
+    finally:
+        cap.release()
+
+class AdaptiveSampler:
+    """
+    Chooses which probed frames go to detection: dense while there is motion
+    or faces, backing off to `max_step` on static footage, at most `budget`.
+    """
+
+    def __init__(self, probe_step, max_step, budget, end_frame=None, min_area=MOTION_MIN_AREA):
+        self.probe_step = max(1, probe_step)
+        self.max_step   = max(self.probe_step, max_step)
+        self.budget     = budget
+        self.end_frame  = end_frame
+        self.min_area   = min_area
+        self.interval   = self.probe_step
+        self.probed     = 0
+        self.kept       = 0
+        self._prev      = None
+        self._last_kept = None
+        self._faces     = False
+
+    @classmethod
+    def for_video(cls, video_path, start_frame=0, end_frame=None, budget=SAMPLE_BUDGET,
+                  min_seconds=SAMPLE_MIN_SECONDS, max_seconds=SAMPLE_MAX_SECONDS,
+                  every_n=SAMPLE_EVERY_N, per_second=SAMPLE_FPS):
+        """
+        Sampler for frames [start_frame, end_frame) of a video. Without a
+        budget it gets the fixed-interval frame count; returns None (sample
+        at the fixed interval) when the video's length is unknown.
+        """
+        cap = cv2.VideoCapture(video_path)
+        fps = (cap.get(cv2.CAP_PROP_FPS) or 30.0) if cap.isOpened() else 30.0
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        cap.release()
+        end = end_frame if end_frame is not None else (n_frames or None)
+        if not budget:
+            if end is None:
+                return None
+            fixed_step = max(fps / per_second if per_second else every_n, 1)
+            budget = max(1, math.ceil((end - start_frame) / fixed_step))
+        return cls(round(fps * min_seconds), round(fps * max_seconds), budget, end)
+
+    def saw_faces(self, frame_id=None):
+        self._faces = True
+
+    def keep(self, frame_id, frame):
+        small = downscale(frame)
+        moved = self._prev is None or motion_area(self._prev, small) >= self.min_area
+        self._prev = small
+        self.probed += 1
+        if moved or self._faces:
+            self.interval = self.probe_step
+        elif frame_id - self._last_kept < self.interval:
+            return False
+        else:
+            self.interval = min(self.interval * 2, self.max_step)
+        left = self.budget - self.kept
+        if self._last_kept is not None and self.end_frame is not None and left > 0:
+            # what is left of the budget beyond one frame per max_step of the
+            # remaining video is free for activity; only without that slack
+            # are kept frames paced, so the budget lasts to the end
+            remaining = self.end_frame - frame_id
+            if remaining / self.max_step >= left and frame_id - self._last_kept < remaining / left:
+                return False
+        self._faces, self._last_kept = False, frame_id
+        self.kept += 1
+        return True
+
+    def select(self, frames):
+        """Filter (frame_id, frame) probes down to the ones worth detecting on."""
+        for fid, frame in frames:
+            if self.kept >= self.budget:
+                return
+            if self.keep(fid, frame):
+                yield fid, frame
+
+    def __str__(self):
+        return f"adaptive: kept {self.kept} of {self.probed} probes (budget {self.budget})"
+
+
+def sample_frames(video_path, every_n=SAMPLE_EVERY_N, per_second=SAMPLE_FPS,
+                  start_frame=0, end_frame=None, seek_gap=SAMPLE_SEEK_GAP, stats=None):
+    """
+    Yield (frame_id, BGR frame) for the sampled frames of `video_path`.
+
+    Frames in between are only grab()bed, never retrieve()d, so they skip
+    the colour conversion and copy (or are seeked over entirely when the
+    gap is at least `seek_gap`). Sampling is every `every_n` frames, or
+    `per_second` frames per second of video when given. Samples always
+    fall on frames ceil(k * step), also from a `start_frame`, so any split
+    of a video samples the same frames as one pass.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    stats = stats if stats is not None else DecodeStats()
+    step = (cap.get(cv2.CAP_PROP_FPS) or 30.0) / per_second if per_second else every_n
+    step = max(step, 1)
+    clock = time.perf_counter
+
+    try:
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        # first k with ceil(k * step) >= start_frame
+        fid, k = start_frame, (math.floor((start_frame - 1) / step) + 1 if start_frame else 0)
+        while end_frame is None or fid < end_frame:
+            want = math.ceil(k * step)
+            t0 = clock()
+            if fid < want:
+                if seek_gap and want - fid >= seek_gap:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, want)
+                    stats.seeks += 1
+                    fid = want
+                    stats.decode_seconds += clock() - t0
+                    continue
+                ok = cap.grab()
+                stats.decode_seconds += clock() - t0
+                if not ok:
+                    break
+                stats.grabbed += 1
+                fid += 1
+                continue
+            ok = cap.grab()
+            ok, frame = cap.retrieve() if ok else (False, None)
+            stats.decode_seconds += clock() - t0
+            if not ok:
+                break
+            stats.grabbed += 1
+            stats.sampled += 1
+            k += 1
+            yield fid, frame
+            fid += 1
+    finally:
+        cap.release()
+
+@contextmanager
+def job_scratch(job_id=None, dump=DUMP_FRAMES, keep=DUMP_FRAMES):
+    """
+    A private scratch directory for one job's frame dumps, or None when
+    `dump` is off. Removed when the job ends unless `keep` is set.
+    """
+    if not dump:
+        yield None
+        return
+    path = tempfile.mkdtemp(prefix=f"student-id-{job_id or 'job'}-", dir=SCRATCH_ROOT)
+    try:
+        yield path
+    finally:
+        if keep:
+            print(f"[scratch] Frames kept in {path}")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+def dump_dirs(scratch):
+    return (os.path.join(scratch, EXTRACTED_DIR), os.path.join(scratch, RESIZED_DIR))
+
+def iter_frames(video_path, interval=SAMPLE_EVERY_N, per_second=SAMPLE_FPS, dump_dirs=None, stats=None,
+                sampler=None, **kwargs):
+    """
+    Yield (frame_id, frame) for the sampled frames of `video_path`, rotated
+    upright and resized to FRAME_SIZE, entirely in memory. With an
+    AdaptiveSampler the video is probed every `sampler.probe_step` frames
+    and only the frames it keeps are yielded.
+
+    With `dump_dirs=(full_dir, resized_dir)` each sampled frame is also
+    written there as JPEG, as the old extract step did.
+    """
+    if dump_dirs:
+        for d in dump_dirs:
+            os.makedirs(d, exist_ok=True)
+    stats = stats if stats is not None else DecodeStats()
+    try:
+        if sampler is not None:
+            interval, per_second = sampler.probe_step, None
+        frames = sample_frames(video_path, interval, per_second, stats=stats, **kwargs)
+        if sampler is not None:
+            frames = sampler.select(frames)
+        for fid, frame in frames:
+            rot   = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+            small = cv2.resize(rot, FRAME_SIZE)
+            if dump_dirs:
+                name = f"frame{fid}.jpg"
+                cv2.imwrite(os.path.join(dump_dirs[0], name), rot)
+                cv2.imwrite(os.path.join(dump_dirs[1], name), small)
+            yield fid, small
+    finally:
+        print(f"[frames] {os.path.basename(video_path)}: {stats}" + (f", {sampler}" if sampler else ""))
+
+def iter_detections(frames, detect_batch, batch_size=8, sampler=None):
+    """
+    Yield (frame_id, frame, faces) for each frame, running
+    `detect_batch([frame, ...])` on `batch_size` frames at a time. Frames
+    with faces are reported to `sampler.saw_faces`, so an adaptive sampler
+    stays dense around people (one batch behind).
+    """
+    pending = []
+    for fid, img in frames:
+        pending.append((fid, img))
+        if len(pending) == batch_size:
+            yield from _flush(pending, detect_batch, sampler)
+            pending = []
+    if pending:
+        yield from _flush(pending, detect_batch, sampler)
+
+def _flush(pending, detect_batch, sampler=None):
+    for (fid, img), faces in zip(pending, detect_batch([img for _, img in pending])):
+        if faces and sampler is not None:
+            sampler.saw_faces(fid)
+        yield fid, img, faces
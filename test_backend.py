@@ -1,5 +1,15 @@
+import asyncio
+import threading
+import pytest
+import numpy as np
 from fastapi.testclient import TestClient
 from backend.main import app  # or from backend.main import app if running from root
+from backend.routes import upload_route
+from backend.routes.ws_live import LatestFrame
+from backend.tasks import process_frame
+from backend.tasks.gallery import Gallery
+from backend.tasks.tracker import IdentityCache
+from backend.tasks.jobs import JobManager
 
 client = TestClient(app)
 
@@ -12,7 +22,123 @@ def test_get_settings():
     response = client.get("/api/settings")
     assert response.status_code in (200, 401)  # 401 if not authenticated
 
-def test_upload_endpoint():
+@pytest.fixture
+def job_manager(monkeypatch, tmp_path, job_store):
+    started, release = threading.Event(), threading.Event()
+    def run(path, mode, job):
+        started.set()
+        while not release.wait(0.01):
+            job.report(0.5)
+        return [{"student": "Student #1"}]
+    manager = JobManager(run, max_workers=1, store=job_store)
+    monkeypatch.setattr(upload_route, "jobs", manager)
+    monkeypatch.setattr(upload_route, "UPLOAD_DIR", str(tmp_path))
+    yield manager, started, release
+    release.set()
+    manager.executor.shutdown(wait=True)
+
+def test_upload_endpoint(job_manager):
     files = {"file": ("test_video.mp4", b"fakevideocontent", "video/mp4")}
-    response = client.post("/upload/", files=files)
-    assert response.status_code in (200, 422)  # 422 if upload validation fails
+    response = client.post("/upload", files=files)
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] in ("queued", "running")
+    assert client.get(f"/upload/jobs/{body['job_id']}").json()["filename"] == "test_video.mp4"
+
+def test_job_status_and_cancel_endpoints(job_manager):
+    manager, started, release = job_manager
+    files = {"file": ("a.mp4", b"fakevideocontent", "video/mp4")}
+    running = client.post("/upload", files=files).json()["job_id"]
+    started.wait(5)
+    queued = client.post("/upload", files=files).json()["job_id"]
+
+    response = client.get(f"/upload/jobs/{queued}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert response.json()["queue_position"] == 1
+
+    response = client.post(f"/upload/jobs/{queued}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    # cancelling again: the job is already finished
+    assert client.post(f"/upload/jobs/{queued}/cancel").status_code == 409
+
+    release.set()
+    manager.executor.shutdown(wait=True)
+    response = client.get(f"/upload/jobs/{running}")
+    assert response.json()["status"] == "done"
+    assert response.json()["results"] == [{"student": "Student #1"}]
+    assert client.post(f"/upload/jobs/{running}/cancel").status_code == 409
+
+    assert client.get("/upload/jobs/nope").status_code == 404
+    assert client.post("/upload/jobs/nope/cancel").status_code == 404
+
+def test_latest_frame_keeps_only_the_newest():
+    async def main():
+        mailbox = LatestFrame()
+        for frame in (b"one", b"two", b"three"):
+            mailbox.put(frame)
+        frame, _ = await mailbox.get()
+        return mailbox, frame
+
+    mailbox, frame = asyncio.run(main())
+    assert frame == b"three"
+    assert mailbox.dropped == 2
+    assert mailbox.received == 3
+
+class _Registry:
+    def __init__(self, **models):
+        self.models = models
+
+    def get(self, name):
+        return self.models[name]
+
+class _OneHotClassifier:
+    classes = ["A", "B"]
+
+    def predict_proba(self, embs):
+        return embs[:, 1:3]
+
+class _CountingMatcher:
+    def __init__(self, gallery):
+        self.gallery, self.calls = gallery, []
+
+    def best_matches(self, probes, threshold):
+        self.calls.append(len(probes))
+        return self.gallery.best_matches(probes, threshold)
+
+def _face(shade, x, side):
+    # crops embed as the one-hot vector of their shade (see embed below)
+    return np.full((side, side, 3), shade, dtype=np.uint8), [x, 0, x + side + 0.4, side], 0.9
+
+def test_identify_frames_mixes_modes_in_one_batch(monkeypatch):
+    dim = 128
+    matcher = _CountingMatcher(Gallery.from_dict({"7": [np.eye(dim)[3]], "8": [np.eye(dim)[4]]}))
+    embedded = []
+    def embed(crops):
+        embedded.append(len(crops))
+        return np.eye(dim, dtype=np.float32)[[int(c[0, 0, 0]) for c in crops]]
+    faces = {
+        "ml":     [_face(1, 0, 20), _face(2, 100, 40)],
+        "cosine": [_face(3, 0, 10), _face(4, 100, 50)],
+    }
+    monkeypatch.setattr(process_frame, "detect_faces_batch", lambda imgs: [faces[img] for img in imgs])
+    monkeypatch.setattr(process_frame, "embed_faces", embed)
+    monkeypatch.setattr(process_frame, "gate", type("Pass", (), {"check": lambda self, crop, conf: None})())
+    monkeypatch.setattr(process_frame, "registry", _Registry(classifier=_OneHotClassifier(), matcher=matcher))
+
+    cache = IdentityCache(window=10)
+    ml, cosine = process_frame.identify_frames([("ml", "ml", None), ("cosine", "cosine", cache)])
+    # one embedding batch and one matcher call for all faces, largest face first
+    assert embedded == [4] and matcher.calls == [2]
+    assert [e["student"] for e in ml] == ["Student #B", "Student #A"]
+    assert [e["student"] for e in cosine] == ["Student #8", "Student #7"]
+    assert ml[0]["bbox"] == [100, 0, 140, 40] and "track" not in ml[0]
+    assert cosine[0]["bbox"] == [100, 0, 150, 50] and cosine[0]["score"] == 1.0
+    assert len({e["track"] for e in cosine}) == 2
+
+    # the camera's cache answers for the same faces next time, without embedding
+    again, = process_frame.identify_frames([("cosine", "cosine", cache)])
+    assert embedded == [4] and matcher.calls == [2]
+    assert [(e["student"], e["track"], e["cached"]) for e in again] == \
+           [(e["student"], e["track"], True) for e in cosine]
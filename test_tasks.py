@@ -0,0 +1,642 @@
+import os
+import numpy as np
+import pytest
+import cv2
+
+from backend.tasks.gallery import Gallery
+from backend.tasks.ann_index import AnnMatcher, load_or_build_index, IVF_NPROBE
+from backend.tasks.tta import TTAPolicy, adaptive_tta, tta_vote
+from backend.tasks.mlp_runtime import NumpyClassifier, export_classifier
+from backend.tasks.model_registry import ModelRegistry
+from backend.tasks import video_frames
+from backend.tasks.video_frames import AdaptiveSampler, DecodeStats, iter_detections, sample_frames, job_scratch, iter_frames
+from backend.tasks.sharded_video import plan_shards
+from backend.tasks.tracker import IdentityCache, iou_matrix, track_faces
+from backend.tasks.jobs import JobManager
+from backend.tasks.live_batcher import MicroBatcher
+from backend.tasks.inference_executor import InferenceExecutor
+from backend.tasks import onnx_runtime
+from backend.tasks import embedding
+from backend.tasks.face_quality import QualityGate
+from backend.tasks.motion import MotionGate
+from backend.tasks import inference_server
+
+
+def _known(n_students=20, per_student=4, dim=128, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        str(1000 + i): rng.normal(size=(per_student + i % 3, dim)).tolist()
+        for i in range(n_students)
+    }
+
+def _loop_best_match(known, emb, threshold):
+    best_id, best_score = None, -1.0
+    for sid, embs in known.items():
+        score = np.mean([np.dot(emb, e) / (np.linalg.norm(emb) * np.linalg.norm(e)) for e in embs])
+        if score >= threshold and score > best_score:
+            best_id, best_score = sid, score
+    return best_id, best_score
+
+def test_gallery_matches_python_loop():
+    known = _known()
+    gallery = Gallery.from_dict(known)
+    probe = np.asarray(known["1007"][0]) + 0.1
+    sid, score = gallery.best_match(probe, 0.15)
+    ref_sid, ref_score = _loop_best_match(known, probe, 0.15)
+    assert sid == ref_sid == "1007"
+    assert abs(score - ref_score) < 1e-5
+
+def test_gallery_below_threshold_returns_none():
+    known = _known()
+    gallery = Gallery.from_dict(known)
+    assert gallery.best_match(np.ones(128), 0.99) == (None, -1.0)
+
+def test_score_students_matches_full_scores():
+    gallery = Gallery.from_dict(_known())
+    probe = np.random.default_rng(3).normal(size=128)
+    idx = [5, 0, 17]
+    assert np.allclose(gallery.score_students(probe, idx), gallery.score(probe)[idx], atol=1e-6)
+
+def test_ivf_matcher_agrees_with_brute_force(tmp_path):
+    gallery = Gallery.from_dict(_known(n_students=200))
+    path = str(tmp_path / "emb.ivf.idx")
+    index = load_or_build_index(gallery, path, "ivf", nprobe=4)
+    reloaded = load_or_build_index(gallery, path, "ivf")
+    assert np.array_equal(index.list_rows, reloaded.list_rows)
+    # nprobe is not baked into the saved index: a reload takes the current setting
+    assert index.nprobe == 4 and reloaded.nprobe == IVF_NPROBE
+    assert load_or_build_index(gallery, path, "ivf", nprobe=2).nprobe == 2
+
+    matcher = AnnMatcher(gallery, reloaded, k=32)
+    probes = []
+    for sid in ("1010", "1150"):
+        probe = np.asarray(gallery.matrix[gallery.offsets[int(sid) - 1000]]) + 0.01
+        got, want = matcher.best_match(probe, 0.1), gallery.best_match(probe, 0.1)
+        assert got[0] == want[0] == sid
+        assert abs(got[1] - want[1]) < 1e-5
+        probes.append(probe)
+    assert [m[0] for m in matcher.best_matches(np.stack(probes), 0.1)] == ["1010", "1150"]
+
+def test_tta_vote_matches_counter_voting():
+    from collections import Counter
+    rng = np.random.default_rng(7)
+    n_tracks, n_aug = 30, 5
+    probs = rng.dirichlet(np.ones(4), size=n_tracks * n_aug)
+    winners, confidences, _ = tta_vote(probs, n_aug)
+    for t in range(n_tracks):
+        p = probs[t * n_aug:(t + 1) * n_aug]
+        votes = [(int(np.argmax(r)), r.max()) for r in p]
+        final = Counter(v[0] for v in votes).most_common(1)[0][0]
+        assert winners[t] == final
+        assert np.isclose(confidences[t], np.mean([c for cid, c in votes if cid == final]))
+
+def test_adaptive_tta_stops_early_only_for_clear_votes():
+    rng = np.random.default_rng(0)
+    def classify(images):
+        # crop 0 is a clear face, crop 1 flips between two classes
+        return np.array([[0.97, 0.01, 0.02] if img == 0 else rng.permutation([0.5, 0.4, 0.1])
+                         for img in images])
+    winners, confidences, used = adaptive_tta(
+        [0, 1], augment=lambda crop: crop, classify=classify,
+        threshold=0.8, policy=TTAPolicy(min_aug=2, max_aug=5),
+    )
+    assert winners[0] == 0 and confidences[0] > 0.9
+    assert used.tolist() == [2, 5]
+
+class Dense:
+    def __init__(self, W, b, activation):
+        self.W, self.b, self.activation, self.name = W, b, activation, "dense"
+    def get_weights(self):
+        return [self.W, self.b]
+    def get_config(self):
+        return {"activation": self.activation}
+
+class BatchNormalization:
+    epsilon, name = 1e-3, "bn"
+    def __init__(self, rng, n):
+        self.weights = [rng.uniform(0.5, 2, n), rng.normal(size=n), rng.normal(size=n), rng.uniform(0.5, 2, n)]
+    def get_weights(self):
+        return self.weights
+
+class Dropout:
+    name = "dropout"
+
+def test_numpy_classifier_matches_unfolded_mlp(tmp_path):
+    rng = np.random.default_rng(0)
+    W1, b1 = rng.normal(size=(128, 32)), rng.normal(size=32)
+    W2, b2 = rng.normal(size=(32, 6)) * 0.3, rng.normal(size=6)
+    bn = BatchNormalization(rng, 32)
+    model = type("Model", (), {"input_shape": (None, 128),
+                               "layers": [Dense(W1, b1, "relu"), bn, Dropout(), Dense(W2, b2, "softmax")]})
+    scaler = type("Scaler", (), {"mean_": rng.normal(size=128), "scale_": rng.uniform(0.5, 2, 128)})
+    classes = np.array(["s1", "s2", "s3", "s4", "s5", "s6"], dtype=object)
+
+    clf = export_classifier(model, scaler, classes)
+    clf.save(str(tmp_path / "mlp.npz"))
+    clf = NumpyClassifier.load(str(tmp_path / "mlp.npz"))
+
+    x = rng.normal(size=(50, 128))
+    h = np.maximum(((x - scaler.mean_) / scaler.scale_) @ W1 + b1, 0)
+    gamma, beta, mu, var = bn.weights
+    h = gamma * (h - mu) / np.sqrt(var + bn.epsilon) + beta
+    logits = h @ W2 + b2
+    ref = np.exp(logits - logits.max(1, keepdims=True))
+    ref /= ref.sum(1, keepdims=True)
+
+    assert np.allclose(clf.predict_proba(x), ref, atol=1e-4)
+    assert clf.classes[np.argmax(ref, 1)].tolist() == classes[np.argmax(ref, 1)].tolist()
+
+def test_model_registry_loads_lazily_once():
+    reg = ModelRegistry()
+    calls = []
+    reg.register("a", lambda: calls.append(1) or "model-a")
+    reg.register("b", lambda: 1 / 0)
+    assert calls == [] and reg.status()["state"] == "cold"
+    assert reg.get("a") == reg.get("a") == "model-a"
+    assert calls == [1] and reg.status()["artifacts"]["a"]["state"] == "ready"
+    status = reg.warm_up()
+    assert status["state"] == "failed" and not status["ready"]
+    assert status["artifacts"]["b"]["error"].startswith("ZeroDivisionError")
+    # readiness over just the artifacts a process owns
+    assert reg.status(["a"])["ready"] and reg.is_ready(["a"]) and not reg.is_ready()
+    assert list(reg.status(["a"])["artifacts"]) == ["a"]
+
+def _write_video(path, n_frames=50, fps=25):
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for i in range(n_frames):
+        out.write(np.full((48, 64, 3), i * 5 % 250, dtype=np.uint8))
+    out.release()
+
+def test_sample_frames_skips_without_retrieving(tmp_path):
+    path = tmp_path / "clip.avi"
+    _write_video(path)
+    stats = DecodeStats()
+    frames = list(sample_frames(str(path), every_n=10, per_second=None, stats=stats))
+    assert [fid for fid, _ in frames] == [0, 10, 20, 30, 40]
+    assert abs(int(frames[2][1].mean()) - 100) <= 3
+    assert stats.sampled == 5 and stats.grabbed == 50
+
+    by_time = list(sample_frames(str(path), per_second=5))
+    assert [fid for fid, _ in by_time] == [0, 5, 10, 15, 20, 25, 30, 35, 40, 45]
+
+    seeked = list(sample_frames(str(path), every_n=10, per_second=None, start_frame=20, end_frame=35))
+    assert [fid for fid, _ in seeked] == [20, 30]
+    assert abs(int(seeked[0][1].mean()) - 100) <= 3
+
+def test_iter_detections_batches_frames_in_order():
+    calls = []
+    def detect_batch(imgs):
+        calls.append(len(imgs))
+        return [[int(img[0, 0])] for img in imgs]
+    frames = [(fid, np.full((4, 4), fid, np.uint8)) for fid in range(0, 100, 10)]
+    out = list(iter_detections(iter(frames), detect_batch, batch_size=4))
+    assert calls == [4, 4, 2]
+    assert [(fid, faces) for fid, _, faces in out] == [(fid, [fid]) for fid, _ in frames]
+
+def test_shards_sample_the_same_frames_as_one_pass(tmp_path):
+    path = str(tmp_path / "long.avi")
+    _write_video(path, n_frames=300, fps=25)
+    shards = plan_shards(path, shard_seconds=3, every_n=20, per_second=None)
+    assert len(shards) > 1 and shards[-1][1] is None
+    whole = [fid for fid, _ in sample_frames(path, every_n=20, per_second=None)]
+    pieces = [fid for s, e in shards
+              for fid, _ in sample_frames(path, every_n=20, per_second=None, start_frame=s, end_frame=e)]
+    assert pieces == whole
+
+def test_shards_match_one_pass_with_a_fractional_step(tmp_path):
+    # 25 fps sampled at 3 per second: a sample every 8.33 frames
+    path = str(tmp_path / "long.avi")
+    _write_video(path, n_frames=300, fps=25)
+    shards = plan_shards(path, shard_seconds=2, per_second=3)
+    assert len(shards) > 2
+    whole = [fid for fid, _ in sample_frames(path, per_second=3)]
+    pieces = [fid for s, e in shards
+              for fid, _ in sample_frames(path, per_second=3, start_frame=s, end_frame=e)]
+    assert pieces == whole
+    assert whole[:4] == [0, 9, 17, 25]
+
+def _face(x, y, size=40):
+    return np.zeros((size, size, 3), np.uint8), (x, y, x + size, y + size)
+
+def test_iou_matrix():
+    iou = iou_matrix([(0, 0, 10, 10), (100, 100, 110, 110)], [(0, 0, 10, 10), (5, 0, 15, 10)])
+    assert np.allclose(iou, [[1.0, 50 / 150], [0.0, 0.0]])
+
+def test_tracker_follows_moving_faces_and_keeps_best_crop():
+    frames = [
+        (0,  [_face(0, 0), _face(300, 300)]),
+        (60, [_face(10, 5), _face(305, 300, size=60)]),   # both move, second gets bigger
+        (120, [_face(20, 10)]),                           # second face leaves
+        (180, [_face(25, 10)]),
+        (240, [_face(30, 10)]),
+        (300, [_face(300, 300)]),                         # someone new in the old spot
+    ]
+    for matching in ("hungarian", "greedy"):
+        tracks = track_faces(frames, iou_threshold=0.3, max_age=1, matching=matching)
+        assert [(t.first_frame, t.last_frame, t.hits) for t in tracks] == [
+            (0, 240, 5), (0, 60, 2), (300, 300, 1),
+        ]
+        assert tracks[0].bbox == (30, 10, 70, 50)
+        assert tracks[1].best_crop.shape[0] == 60
+
+def test_identity_cache_reuses_identity_and_dedups_alerts():
+    cache = IdentityCache(window=10, max_gap=2)
+    alice = {"type": "success", "student": "Student #7"}
+
+    (track,) = cache.assign([(0, 0, 50, 50)], now=0.0)
+    assert cache.cached_identity(track, 0.0) is None
+    cache.remember(track, alice, 0.0)
+    assert cache.should_alert({**alice, "track": track.id}, 0.0)
+
+    # same person a little later, slightly moved: no embedding, no new alert
+    (again,) = cache.assign([(3, 2, 53, 52)], now=1.0)
+    assert again is track
+    assert cache.cached_identity(again, 1.0)["student"] == "Student #7"
+    assert not cache.should_alert({**alice, "track": again.id}, 1.0)
+
+    # an unknown face next to them is its own track, alerted once
+    known, stranger = cache.assign([(3, 2, 53, 52), (200, 0, 250, 50)], now=1.5)
+    assert known is track and stranger is not track
+    assert cache.cached_identity(stranger, 1.5) is None
+    cache.remember(stranger, {"type": "warning", "student": "Unknown"}, 1.5)
+    unknown = {"type": "warning", "student": "Unknown", "track": stranger.id}
+    assert cache.should_alert(unknown, 1.5) and not cache.should_alert(unknown, 2.0)
+    assert cache.cached_identity(stranger, 2.0) is None
+
+    # after the window the face is identified and alerted again
+    (later,) = cache.assign([(3, 2, 53, 52)], now=11.0)
+    assert cache.cached_identity(later, 11.0) is None
+    assert cache.should_alert({**alice, "track": later.id}, 11.0)
+
+def test_identity_cache_keeps_tracks_through_motion_skipped_frames():
+    cache = IdentityCache(window=10, max_gap=2)
+    (track,) = cache.assign([(0, 0, 50, 50)], now=0.0)
+    cache.remember(track, {"type": "success", "student": "Student #7"}, 0.0)
+    # nobody moved for 5 s, so detection only ran again on the forced pass
+    for now in (1.0, 2.0, 3.0, 4.0):
+        cache.touch(now)
+    (again,) = cache.assign([(0, 0, 50, 50)], now=5.0)
+    assert again is track
+    assert cache.cached_identity(again, 5.0)["student"] == "Student #7"
+
+def test_job_manager_queues_reports_and_cancels(job_store):
+    import threading
+    release, started = threading.Event(), threading.Event()
+    def run(path, mode, job):
+        started.set()
+        for i in range(100):
+            release.wait()
+            job.report(i / 100)
+        if path == "bad.mp4":
+            raise ValueError("unreadable")
+        return [{"student": path}]
+
+    manager = JobManager(run, max_workers=1, store=job_store)
+    first = manager.submit("a.mp4", "a.mp4", "matching")
+    started.wait(5)
+    second, third = (manager.submit(p, p, "matching") for p in ("b.mp4", "bad.mp4"))
+    try:
+        assert manager.get(first)["status"] == "running"
+        assert manager.get(second)["queue_position"] == 1
+        assert manager.get(third)["queue_position"] == 2
+
+        assert manager.cancel(second)
+        assert manager.get(second)["status"] == "cancelled"
+        assert manager.get(third)["queue_position"] == 1
+    finally:
+        release.set()
+    manager.executor.shutdown(wait=True)
+    assert manager.get(first)["status"] == "done"
+    assert manager.get(first)["results"] == [{"student": "a.mp4"}]
+    assert manager.get(first)["progress"] == 1.0
+    assert manager.get(third)["status"] == "failed"
+    assert "unreadable" in manager.get(third)["error"]
+    assert not manager.cancel(first)
+
+def test_job_manager_stops_running_job_at_next_report(job_store):
+    import threading
+    started = threading.Event()
+    def run(path, mode, job):
+        started.set()
+        while True:
+            job.report(0.5)
+    manager = JobManager(run, max_workers=1, store=job_store)
+    job_id = manager.submit("a.mp4", "a.mp4", "ml")
+    started.wait(5)
+    assert manager.cancel(job_id)
+    manager.executor.shutdown(wait=True)
+    assert manager.get(job_id)["status"] == "cancelled"
+
+def test_job_cancelled_after_its_last_report_ends_cancelled(job_store):
+    import threading
+    started, release = threading.Event(), threading.Event()
+    def run(path, mode, job):
+        job.report(0.9)
+        started.set()
+        release.wait(5)  # e.g. storing alerts, no further report
+        return [{"student": path}]
+    manager = JobManager(run, max_workers=1, store=job_store)
+    job_id = manager.submit("a.mp4", "a.mp4", "matching")
+    started.wait(5)
+    assert manager.cancel(job_id)
+    release.set()
+    manager.executor.shutdown(wait=True)
+    assert manager.get(job_id)["status"] == "cancelled"
+    assert not manager.cancel(job_id)
+
+def test_job_handle_keeps_the_submitting_event_loop(job_store):
+    import asyncio
+    seen = []
+    manager = JobManager(lambda path, mode, job: seen.append(job.loop), max_workers=1, store=job_store)
+    async def upload():
+        manager.submit("a.mp4", "a.mp4", "matching")
+        return asyncio.get_running_loop()
+    loop = asyncio.run(upload())
+    manager.submit("b.mp4", "b.mp4", "matching")  # outside any loop
+    manager.executor.shutdown(wait=True)
+    assert seen == [loop, None]
+
+def test_micro_batcher_batches_callers_and_routes_results():
+    import asyncio
+    seen = []
+    def fn(items):
+        seen.append(list(items))
+        if "bad" in items:
+            raise ValueError("bad frame")
+        return [item.upper() for item in items]
+
+    async def camera(batcher, name, n):
+        return [await batcher.submit(f"{name}{i}") for i in range(n)]
+
+    async def main():
+        batcher = MicroBatcher(fn, max_batch=4, max_wait=0.05)
+        results = await asyncio.gather(*(camera(batcher, c, 3) for c in "abcdef"))
+        try:
+            await batcher.submit("bad")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("error not propagated")
+        # a bad frame batched with good ones fails only its own caller
+        mixed = await asyncio.gather(*(batcher.submit(i) for i in ("x", "bad", "y")), return_exceptions=True)
+        assert mixed[0] == "X" and mixed[2] == "Y" and isinstance(mixed[1], ValueError)
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert results == [[f"{c.upper()}{i}" for i in range(3)] for c in "abcdef"]
+    assert max(len(b) for b in seen) == 4
+    assert len(seen) < 18
+    assert batcher.items == 22
+    stats = batcher.stats()
+    assert stats["queue_depth"] == 0
+    # frames queued behind a running batch waited for it
+    assert stats["wait_ms"]["max"] > stats["wait_ms"]["mean"] > 0
+
+def test_live_batches_run_on_inference_executor():
+    import asyncio, threading
+    executor = InferenceExecutor(workers=2)
+    threads = set()
+    def fn(items):
+        threads.add(threading.current_thread().name)
+        return [i * 2 for i in items]
+
+    async def main():
+        batcher = MicroBatcher(fn, max_batch=3, max_wait=0.01, run=executor.run, max_inflight=executor.workers)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    assert asyncio.run(main()) == [i * 2 for i in range(10)]
+    assert all(name.startswith("inference") for name in threads)
+    stats = executor.stats()
+    assert stats["queue_depth"] == 0 and stats["running"] == 0
+    assert stats["completed"] >= 4 and stats["wait_ms"]["max"] is not None
+
+class _ShadeEngine:
+    """Fake Facenet: embeds each face as its mean shade, and records batch sizes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed(self, faces):
+        self.batches.append(len(faces))
+        out = np.zeros((len(faces), embedding.EMBEDDING_DIM), dtype=np.float32)
+        out[:, 0] = np.asarray(faces).reshape(len(faces), -1).mean(axis=1) + 1
+        return out
+
+def _shade_crops(n):
+    return [np.full((30 + i, 20 + i, 3), 10 + 5 * i, dtype=np.uint8) for i in range(n)]
+
+def test_embed_faces_drops_padding_rows(monkeypatch):
+    engine = _ShadeEngine()
+    monkeypatch.setattr(embedding, "get_engine", lambda: engine)
+    crops = _shade_crops(5)
+    embs = embedding.embed_faces_local(crops, batch_size=16)
+    # padded to 8 for the model, but only the 5 real faces come back, in order
+    assert engine.batches == [8]
+    assert embs.shape == (5, embedding.EMBEDDING_DIM)
+    assert embs[:, 0].tolist() == [11 + 5 * i for i in range(5)]
+    assert embedding.embed_faces_local([], batch_size=16).shape == (0, embedding.EMBEDDING_DIM)
+
+def test_embed_faces_batches_and_stays_aligned(monkeypatch):
+    engine = _ShadeEngine()
+    monkeypatch.setattr(embedding, "get_engine", lambda: engine)
+    monkeypatch.setattr(embedding, "inference_client", lambda: None)
+    crops = _shade_crops(37)
+    embs = embedding.embed_faces(crops, batch_size=16)
+    assert engine.batches == [16, 16, 8]
+    assert embs[:, 0].tolist() == [11 + 5 * i for i in range(37)]
+
+def test_numpy_nms_and_scale_coords():
+    # two overlapping faces and one separate, as (x, y, w, h, obj, cls) rows
+    pred = np.array([[
+        [100, 100, 40, 40, 0.9, 1.0],
+        [102, 101, 40, 40, 0.8, 1.0],   # duplicate of the first
+        [300, 200, 50, 60, 0.7, 1.0],
+        [500, 500, 30, 30, 0.1, 1.0],   # below conf_thres
+    ]], dtype=np.float32)
+    (dets,) = onnx_runtime.non_max_suppression(pred, conf_thres=0.25, iou_thres=0.45)
+    assert np.allclose(dets[:, :5], [[80, 80, 120, 120, 0.9], [275, 170, 325, 230, 0.7]])
+
+    # a 320x480 frame letterboxed into 640x640: scale 4/3, 106.67 px of padding top and bottom
+    boxes = np.array([[0, 640 / 6, 640, 640 * 5 / 6]], dtype=np.float32)
+    assert np.allclose(onnx_runtime.scale_coords((640, 640), boxes, (320, 480, 3)), [[0, 0, 480, 320]], atol=1e-3)
+
+def test_onnx_facenet_matches_tensorflow():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tensorflow")
+    if not os.path.exists(onnx_runtime.FACENET_ONNX_PATH):
+        pytest.skip("Facenet has not been exported to ONNX")
+    from backend.tasks.embedding import FacenetEngine
+    engine = onnx_runtime.OnnxFacenetEngine(onnx_runtime.FACENET_ONNX_PATH)
+    assert onnx_runtime.facenet_parity(FacenetEngine(), engine) >= 0.9999
+
+def _textured_face(size, brightness=128, blur=0):
+    rng = np.random.default_rng(size)
+    img = np.clip(brightness + rng.normal(0, 40, (size, size, 3)), 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (0, 0), blur) if blur else img
+
+def test_quality_gate_reasons_and_best_crop_per_track():
+    gate = QualityGate(min_size=32, min_sharpness=25, min_confidence=0.5)
+    assert gate.check(_textured_face(80), conf=0.9) is None
+    assert gate.check(_textured_face(20), conf=0.9) == "too_small"
+    assert gate.check(_textured_face(80, blur=6), conf=0.9) == "blurry"
+    assert gate.check(_textured_face(80, brightness=10), conf=0.9) == "too_dark"
+    assert gate.check(_textured_face(80), conf=0.3) == "low_confidence"
+    stats = gate.stats()
+    assert stats["passed"] == 1 and stats["skipped"]["blurry"] == 1 and stats["skip_rate"] == 0.8
+
+    # a big blurry crop loses to a smaller sharp one within the same track
+    sharp, blurry = _textured_face(60), _textured_face(120, blur=6)
+    frames = [(0, [(blurry, (0, 0, 120, 120), 0.9)]), (60, [(sharp, (10, 10, 130, 130), 0.8)])]
+    (track,) = track_faces(frames, quality=gate.score)
+    assert track.best_crop is sharp and track.best_conf == 0.8
+
+def test_motion_gate_skips_static_frames_and_forces_detection():
+    rng = np.random.default_rng(0)
+    empty = rng.integers(90, 110, (480, 640, 3), dtype=np.uint8)
+    noisy = np.clip(empty.astype(int) + rng.integers(-3, 4, empty.shape), 0, 255).astype(np.uint8)
+    person = empty.copy()
+    person[100:400, 250:400] = 220
+
+    gate = MotionGate(min_area=0.01, pixel_delta=25, force_seconds=5)
+    decisions = [gate.should_detect(img, t) for t, img in
+                 [(0.0, empty), (0.5, noisy), (1.0, empty), (1.5, person), (2.0, person), (7.0, person)]]
+    assert decisions == [True, False, False, True, False, True]
+    assert gate.counts["skipped"] == 3 and gate.counts["forced"] == 1
+
+def test_adaptive_sampler_backs_off_on_static_footage(tmp_path):
+    # 400 frames: idle, someone walks through frames 200-239, idle again
+    path = str(tmp_path / "gate.avi")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(400):
+        frame = np.full((48, 64, 3), 100, dtype=np.uint8)
+        if 200 <= i < 240:
+            x = (i - 200)
+            frame[10:40, x:x + 20] = 250
+        out.write(frame)
+    out.release()
+
+    stats = DecodeStats()
+    sampler = AdaptiveSampler(probe_step=4, max_step=64, budget=1000, end_frame=400)
+    fids = [fid for fid, _ in sampler.select(sample_frames(path, every_n=4, per_second=None, stats=stats))]
+    assert stats.sampled == 100 and sampler.probed == 100
+    # only a fraction goes to detection, but every probe while the person is in view
+    assert len(fids) < 40
+    assert [f for f in fids if 196 <= f < 244] == list(range(200, 244, 4))
+    assert max(b - a for a, b in zip(fids, fids[1:])) <= 64
+
+    # faces keep sampling dense even without motion
+    sampler = AdaptiveSampler(probe_step=4, max_step=64, budget=1000, end_frame=400)
+    kept = []
+    for fid, frame in sample_frames(path, every_n=4, per_second=None, end_frame=120):
+        if sampler.keep(fid, frame):
+            kept.append(fid)
+            sampler.saw_faces(fid)
+    assert kept == list(range(0, 120, 4))
+
+    # a tight budget is spread over the whole video
+    capped = AdaptiveSampler(probe_step=1, max_step=1, budget=10, end_frame=400)
+    fids = [fid for fid, _ in capped.select(sample_frames(path, every_n=1, per_second=None))]
+    assert len(fids) == 10 and fids[-1] >= 300
+
+def test_adaptive_sampler_keeps_activity_dense_on_long_videos():
+    # 30 min at 30 fps, probed every 8 frames; someone walks by in frames 3000-3599
+    still = np.full((48, 64, 3), 100, dtype=np.uint8)
+    sampler = AdaptiveSampler(probe_step=8, max_step=90, budget=900, end_frame=54000)
+    kept = []
+    for fid in range(0, 54000, 8):
+        frame = still
+        if 3000 <= fid < 3600:
+            frame = still.copy()
+            x = (fid - 3000) // 12
+            frame[10:40, x:x + 12] = 250
+        if sampler.keep(fid, frame):
+            kept.append(fid)
+    assert [f for f in kept if 3000 <= f < 3600] == list(range(3000, 3600, 8))
+    assert len(kept) <= 900
+    assert max(b - a for a, b in zip(kept, kept[1:])) <= 96
+
+def test_adaptive_sampler_never_detects_more_than_fixed_sampling(tmp_path):
+    # handheld footage: every frame differs from the last
+    path = str(tmp_path / "shaky.avi")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        out.write(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8))
+    out.release()
+
+    sampler = AdaptiveSampler.for_video(path, budget=0, every_n=30, per_second=None)
+    assert sampler.budget == 10
+    kept = list(sampler.select(sample_frames(path, every_n=sampler.probe_step, per_second=None)))
+    assert len(kept) == 10 and kept[-1][0] >= 200
+
+def test_iter_frames_rotates_resizes_and_dumps(tmp_path):
+    # 64x48 frames, bright in the top-left corner
+    path = str(tmp_path / "clip.avi")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for _ in range(10):
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        frame[:24, :32] = 255
+        out.write(frame)
+    out.release()
+
+    dumps = (str(tmp_path / "full"), str(tmp_path / "small"))
+    frames = list(iter_frames(path, 3, per_second=None, dump_dirs=dumps))
+    assert [fid for fid, _ in frames] == [0, 3, 6, 9]
+    for _, img in frames:
+        # turned clockwise, so the bright corner is now the top-right
+        assert img.shape == (640, 640, 3)
+        assert img[:320, 320:].mean() > 200 and img[320:].mean() < 50 and img[:, :320].mean() < 50
+    assert sorted(os.listdir(dumps[0])) == sorted(os.listdir(dumps[1])) == \
+           [f"frame{fid}.jpg" for fid in (0, 3, 6, 9)]
+    assert cv2.imread(os.path.join(dumps[0], "frame3.jpg")).shape == (64, 48, 3)
+    assert cv2.imread(os.path.join(dumps[1], "frame3.jpg")).shape == (640, 640, 3)
+
+    assert len(list(iter_frames(path, 3, per_second=None))) == 4
+    assert sorted(os.listdir(tmp_path)) == ["clip.avi", "full", "small"]
+
+def test_job_scratch_is_private_per_job_and_only_made_for_dumps(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_frames, "SCRATCH_ROOT", str(tmp_path))
+    with job_scratch("a", dump=False) as none:
+        assert none is None
+    assert os.listdir(tmp_path) == []
+
+    with job_scratch("a", dump=True, keep=False) as a, job_scratch("b", dump=True, keep=False) as b:
+        assert a != b and os.path.isdir(a) and os.path.isdir(b)
+        open(os.path.join(a, "frame0.jpg"), "wb").close()
+        with job_scratch("a", dump=True, keep=False) as again:
+            assert again not in (a, b)
+        # the second "a" job cleans up after itself only
+        assert not os.path.exists(again) and os.path.isfile(os.path.join(a, "frame0.jpg"))
+    assert os.listdir(tmp_path) == []
+
+    with job_scratch("c", dump=True, keep=True) as c:
+        pass
+    assert os.path.isdir(c)
+
+def test_inference_client_round_trip_and_authkey(tmp_path):
+    import threading
+    from multiprocessing.connection import Listener, AuthenticationError
+    address = str(tmp_path / "inference.sock")
+    handlers = {
+        "ping": lambda: "pong",
+        "detect_batch": lambda imgs, conf, iou, bs: [np.full((1, 5), len(img)) for img in imgs],
+        "boom": lambda: 1 / 0,
+    }
+    listener = Listener(address, family="AF_UNIX", authkey=b"secret")
+    threading.Thread(target=inference_server._accept_loop, args=(listener, handlers, {}), daemon=True).start()
+
+    client = inference_server.InferenceClient(address, key=b"secret")
+    assert client.call("ping") == "pong"
+    boxes = client.detect_batch([np.zeros(3), np.zeros(5)], 0.25, 0.45, 8)
+    assert [b[0, 0] for b in boxes] == [3, 5]
+    with pytest.raises(inference_server.InferenceError, match="ZeroDivisionError"):
+        client.call("boom")
+    assert client.call("ping") == "pong"  # the connection survives a failed call
+
+    with pytest.raises(AuthenticationError):
+        inference_server.InferenceClient(address, key=b"guess").call("ping")
+
+def test_inference_client_requires_an_authkey(monkeypatch):
+    monkeypatch.delenv("INFERENCE_AUTHKEY", raising=False)
+    with pytest.raises(RuntimeError, match="INFERENCE_AUTHKEY"):
+        inference_server.InferenceClient("/tmp/nowhere.sock")